@@ -1,20 +1,595 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+from flask import (Flask, Request, render_template, request, redirect, url_for, session, flash, jsonify, make_response, g, has_app_context,
+                   abort, send_from_directory, before_render_template, template_rendered)
 from functools import wraps
+import click
 import sqlite3
 import os
 import hashlib
+import hmac
 import json
+import math
+import atexit
+import bisect
+import gzip
+import mimetypes
+import posixpath
+import queue
+import re
+import shutil
+import tempfile
+import threading
+import time
 from datetime import datetime, timedelta
-from werkzeug.utils import secure_filename
+from werkzeug.exceptions import RequestEntityTooLarge, TooManyRequests
+from werkzeug.middleware.proxy_fix import ProxyFix
+from werkzeug.utils import safe_join
+from jinja2 import FileSystemBytecodeCache
+from markupsafe import Markup, escape
+from PIL import Image, ImageOps
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
 
 app = Flask(__name__)
 app.secret_key = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production') 
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(hours=2)
 
-app.config['UPLOAD_FOLDER'] = 'static/uploads/schools'
-app.config['UPLOAD_FOLDER_EVENTS'] = 'static/uploads/events'
+# Upload and staging folders are built from one root, so moving a file between
+# them never crosses a filesystem and does not depend on the working directory.
+app.config['UPLOAD_ROOT'] = os.environ.get('UPLOAD_ROOT', app.root_path)
+app.config['UPLOAD_FOLDER'] = os.path.join(app.config['UPLOAD_ROOT'], 'static/uploads/schools')
+app.config['UPLOAD_FOLDER_EVENTS'] = os.path.join(app.config['UPLOAD_ROOT'], 'static/uploads/events')
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  
 app.config['ALLOWED_EXTENSIONS'] = {'png', 'jpg', 'jpeg','webp'}
+app.config['UPLOAD_MAX_FILE_SIZE'] = 8 * 1024 * 1024
+app.config['UPLOAD_MAX_DIMENSION'] = 10000
+app.config['UPLOAD_MAX_PIXELS'] = 40 * 1000 * 1000
+# Outside the static folder, so partial and unvalidated uploads are never served.
+app.config['UPLOAD_TEMP_FOLDER'] = os.path.join(app.config['UPLOAD_ROOT'], 'instance/uploads-incoming')
+# Accepted uploads wait here, per folder, until process_image has stripped their metadata.
+app.config['UPLOAD_STAGING_FOLDER'] = os.path.join(app.config['UPLOAD_ROOT'], 'instance/uploads-staging')
+app.config['DATABASE'] = os.environ.get('DATABASE', 'site.db')
+app.config['CONTENT_GENERATION_FILE'] = app.config['DATABASE'] + '.generation'
+app.config['RATE_LIMIT_DATABASE'] = os.environ.get('RATE_LIMIT_DATABASE', app.config['DATABASE'] + '.ratelimit')
+app.config['RATE_LIMIT_ENABLED'] = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() != 'false'
+# (burst, seconds) per client address: burst requests at once, refilled evenly over seconds.
+app.config['RATE_LIMITS'] = {'contact': (5, 60), 'login': (10, 300)}
+app.config['PROXY_HOPS'] = int(os.environ.get('PROXY_HOPS', 0))
+app.config['SQLITE_BUSY_TIMEOUT'] = 5.0
+app.config['SQLITE_CACHE_SIZE_KB'] = 8 * 1024
+app.config['SQLITE_MMAP_SIZE'] = 64 * 1024 * 1024
+app.config['MESSAGES_PER_PAGE'] = 25
+app.config['SEARCH_RESULTS_PER_PAGE'] = 20
+app.config['LANDING_PAST_EVENTS'] = 6
+app.config['EVENT_ARCHIVE_PAGE_SIZE'] = 6
+app.config['EVENT_PREVIEW_IMAGES'] = 4
+app.config['API_PAGE_SIZE'] = 20
+app.config['API_MAX_PAGE_SIZE'] = 100
+app.config['API_CACHE_MAX_AGE'] = 60
+app.config['API_PROXY_MAX_AGE'] = 300
+app.config['UPLOAD_FOLDERS'] = {
+    'schools': app.config['UPLOAD_FOLDER'],
+    'events': app.config['UPLOAD_FOLDER_EVENTS'],
+    'team': os.path.join(app.config['UPLOAD_ROOT'], 'static/uploads/team'),
+    'hero': os.path.join(app.config['UPLOAD_ROOT'], 'static/uploads/hero'),
+    'about': os.path.join(app.config['UPLOAD_ROOT'], 'static/uploads/about'),
+}
+app.config['IMAGE_MAX_WIDTH'] = 1600
+app.config['IMAGE_VARIANT_WIDTHS'] = (320, 768, 1600)
+app.config['IMAGE_QUALITY'] = 82
+app.config['ASSET_DIST_FOLDER'] = os.path.join(app.static_folder, 'dist')
+app.config['EXPORT_FOLDER'] = os.environ.get('EXPORT_FOLDER')
+app.config['TEMPLATE_CACHE_FOLDER'] = os.environ.get('TEMPLATE_CACHE_FOLDER', os.path.join(app.instance_path, 'jinja-cache'))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+app.config['SERVER_TIMING'] = os.environ.get('SERVER_TIMING', 'true').lower() != 'false'
+app.config['COMPRESS_RESPONSES'] = os.environ.get('COMPRESS_RESPONSES', 'true').lower() != 'false'
+app.config['COMPRESS_MIMETYPES'] = {'text/html', 'text/plain', 'text/css', 'text/javascript', 'application/javascript',
+                                    'application/json', 'application/xml', 'image/svg+xml'}
+app.config['COMPRESS_MIN_SIZE'] = 1024
+app.config['COMPRESS_GZIP_LEVEL'] = 6
+app.config['COMPRESS_BROTLI_QUALITY'] = 5
+app.config['COMPRESS_CACHE_ENTRIES'] = 256
+app.config['MINIFY_HTML'] = os.environ.get('MINIFY_HTML', 'false').lower() == 'true'
+app.config['CONTACT_BUFFERED'] = os.environ.get('CONTACT_BUFFERED', 'false').lower() == 'true'
+app.config['CONTACT_QUEUE_SIZE'] = 1000
+app.config['CONTACT_QUEUE_TIMEOUT'] = 2.0
+app.config['CONTACT_BATCH_SIZE'] = 100
+app.config['CONTACT_BATCH_LINGER'] = 0.002
+app.config['JOB_WORKERS'] = int(os.environ.get('JOB_WORKERS', 1))
+app.config['JOB_POLL_INTERVAL'] = 2.0
+app.config['JOB_RETRY_DELAY'] = 30
+app.config['JOB_STALE_AFTER_MINUTES'] = 10
+app.config['JOB_KEEP_DAYS'] = 7
+# Job kind -> hours between runs, enqueued by the job workers' maintenance pass.
+app.config['PERIODIC_JOBS'] = {'gc_uploads': 24, 'backup_site': 24}
+app.config['UPLOAD_GC_GRACE_HOURS'] = 24
+app.config['BACKUP_FOLDER'] = os.environ.get('BACKUP_FOLDER')
+app.config['BACKUP_KEEP'] = 7
+app.config['BACKUP_PAGES_PER_STEP'] = 256
+app.config['BACKUP_STEP_SLEEP'] = 0.02
+
+# Compiled templates are kept on disk, so a restarted worker loads bytecode
+# instead of parsing and compiling every template again.
+os.makedirs(app.config['TEMPLATE_CACHE_FOLDER'], exist_ok=True)
+app.jinja_options = {**app.jinja_options, 'bytecode_cache': FileSystemBytecodeCache(app.config['TEMPLATE_CACHE_FOLDER'])}
+
+# Behind a load balancer remote_addr is the proxy; PROXY_HOPS says how many
+# X-Forwarded-For entries our own proxies append and can be trusted.
+if app.config['PROXY_HOPS']:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_HOPS'])
+
+def parse_date(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d')
+    except ValueError:
+        return None
+
+def upload_path(folder, filename):
+    return os.path.join(app.config['UPLOAD_FOLDERS'][folder], filename)
+
+def staged_upload_path(folder, filename):
+    return os.path.join(app.config['UPLOAD_STAGING_FOLDER'], folder, filename)
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+# Uploads are named after the SHA-256 of their bytes as published, i.e. after
+# prepare_image() has re-encoded them, so the same image uploaded twice is stored
+# once and its URL never changes content. Until then they are staged under the
+# hash of the bytes as sent (see rename_upload). media.ref_count tracks
+# how many rows point at a file; it is only unlinked when the last one goes.
+HASHED_UPLOAD_PATTERN = re.compile(r'uploads/[\w-]+/(derived/)?[0-9a-f]{64}(-\d+)?\.\w+')
+
+def sniff_image_type(header):
+    """Return the upload extension for a JPEG, PNG or WebP header, or None."""
+    if header.startswith(b'\xff\xd8\xff'):
+        return 'jpg'
+    if header.startswith(b'\x89PNG\r\n\x1a\n'):
+        return 'png'
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp'
+    return None
+
+class UploadStream:
+    """Write target for one multipart file part.
+
+    Werkzeug streams the part into this object chunk by chunk. The bytes go to
+    a temp file in UPLOAD_TEMP_FOLDER as they arrive, and the part is rejected
+    as soon as its extension, leading magic bytes or size rule it out, and are
+    hashed on the way. After a rejection the rest of the part is discarded instead
+    of buffered, and save_upload() reports the reason.
+    """
+    HEADER_SIZE = 12
+
+    def __init__(self, filename):
+        self.filename = filename
+        self.checked = False
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.header = b''
+        self.extension = None
+        self.error = None
+        self.started = self.finished = time.perf_counter()
+        if not filename or not allowed_file(filename):
+            self.error = 'only PNG, JPEG and WebP images can be uploaded'
+        directory = app.config['UPLOAD_TEMP_FOLDER']
+        os.makedirs(directory, exist_ok=True)
+        fd, self.path = tempfile.mkstemp(dir=directory, suffix='.upload')
+        self.file = os.fdopen(fd, 'w+b')
+
+    def write(self, data):
+        if self.error:
+            return len(data)
+        self.size += len(data)
+        if self.size > app.config['UPLOAD_MAX_FILE_SIZE']:
+            return self.reject(f"it is larger than {app.config['UPLOAD_MAX_FILE_SIZE'] // (1024 * 1024)} MB", len(data))
+        if self.extension is None and len(self.header) < self.HEADER_SIZE:
+            self.header += data[:self.HEADER_SIZE - len(self.header)]
+            if len(self.header) == self.HEADER_SIZE:
+                self.extension = sniff_image_type(self.header)
+                if self.extension is None:
+                    return self.reject('it is not a PNG, JPEG or WebP image', len(data))
+        self.digest.update(data)
+        self.finished = time.perf_counter()
+        return self.file.write(data)
+
+    def reject(self, error, written):
+        self.error = error
+        self.file.truncate(0)
+        return written
+
+    def seek(self, *args):
+        return self.file.seek(*args)
+
+    def read(self, *args):
+        return self.file.read(*args)
+
+    def readline(self, *args):
+        return self.file.readline(*args)
+
+    def tell(self):
+        return self.file.tell()
+
+    def flush(self):
+        return self.file.flush()
+
+    def close(self):
+        self.file.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+class UploadRequest(Request):
+    max_form_memory_size = 1024 * 1024
+    max_form_parts = 200
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        return UploadStream(filename)
+
+app.request_class = UploadRequest
+
+@app.errorhandler(RequestEntityTooLarge)
+def request_too_large(e):
+    if request.path.startswith('/admin/'):
+        flash(f"The upload was too large. Requests are limited to {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB.", 'error')
+        return redirect(request.path)
+    return e
+
+def prepare_upload(file):
+    """Validate an uploaded image and return whether it can be saved.
+
+    Returns False when no file was sent or the file was rejected, flashing the
+    reason in the latter case. Only the header is parsed here; decoding and
+    re-encoding happen in the process_image job.
+    """
+    if not file or file.filename == '':
+        return False
+    upload = file.stream
+    if upload.checked:
+        return not upload.error
+    upload.checked = True
+    if not upload.error and upload.extension is None:
+        upload.error = 'it is not a PNG, JPEG or WebP image'
+    if not upload.error:
+        upload.flush()
+        try:
+            with Image.open(upload.path) as image:
+                if (image.format or '').lower() != {'jpg': 'jpeg'}.get(upload.extension, upload.extension):
+                    upload.error = 'its contents do not match its image type'
+                elif max(image.size) > app.config['UPLOAD_MAX_DIMENSION'] or image.width * image.height > app.config['UPLOAD_MAX_PIXELS']:
+                    upload.error = f"it is larger than {app.config['UPLOAD_MAX_DIMENSION']} pixels on a side"
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            upload.error = 'it could not be read as an image'
+    if upload.error:
+        flash(f'{file.filename} was not uploaded: {upload.error}.', 'error')
+        return False
+    return True
+
+def save_upload(file, folder):
+    """Stage an uploaded image parsed into an UploadStream and return its filename.
+
+    The file stays out of the static folder until the process_image job has
+    re-encoded it without metadata and published it. Returns None when no file
+    was sent or the file was rejected, flashing the reason in the latter case.
+    """
+    if not prepare_upload(file):
+        return None
+    upload = file.stream
+    record_upload(upload.size, upload.finished - upload.started)
+    filename = f'{upload.digest.hexdigest()}.{upload.extension}'
+    staged_path = staged_upload_path(folder, filename)
+    os.makedirs(os.path.dirname(staged_path), exist_ok=True)
+    conn = get_db_connection()
+    # Taking the write lock before touching the file orders this against a
+    # delete_files job for the same content.
+    conn.execute('''INSERT INTO media (folder, filename, sha256, ref_count) VALUES (?, ?, ?, 1)
+                    ON CONFLICT (folder, filename) DO UPDATE SET ref_count = ref_count + 1''',
+                 (folder, filename, upload.digest.hexdigest()))
+    media = conn.execute('SELECT ref_count, width FROM media WHERE folder = ? AND filename = ?', (folder, filename)).fetchone()
+    if media['width'] is not None and os.path.exists(upload_path(folder, filename)):
+        # The bytes sent are an image this site already published.
+        return filename
+    if media['ref_count'] == 1 or not os.path.exists(staged_path):
+        os.replace(upload.path, staged_path)
+        enqueue_job(conn, 'process_image', folder=folder, filename=filename)
+    return filename
+
+def save_uploads(files, folder):
+    """save_upload() each file and return the stored filenames, validating them all before the first write."""
+    for file in files:
+        prepare_upload(file)
+    return [filename for filename in (save_upload(file, folder) for file in files) if filename]
+
+def delete_uploads(conn, references):
+    """Drop one reference per (folder, filename) and queue a single job unlinking the files nothing uses any more."""
+    uploads = []
+    for folder, filename in references:
+        conn.execute('UPDATE media SET ref_count = ref_count - 1 WHERE folder = ? AND filename = ?', (folder, filename))
+        media = conn.execute('SELECT ref_count, variants FROM media WHERE folder = ? AND filename = ?', (folder, filename)).fetchone()
+        if media and media['ref_count'] > 0:
+            continue
+        paths = [upload_path(folder, filename), staged_upload_path(folder, filename)]
+        if media and media['variants']:
+            paths.extend(upload_path(folder, variant['filename']) for variant in json.loads(media['variants']))
+        conn.execute('DELETE FROM media WHERE folder = ? AND filename = ?', (folder, filename))
+        uploads.append({'folder': folder, 'filename': filename, 'paths': paths})
+    if uploads:
+        enqueue_job(conn, 'delete_files', uploads=uploads)
+
+def delete_upload(folder, filename):
+    delete_uploads(get_db_connection(), [(folder, filename)])
+
+@app.after_request
+def cache_hashed_uploads(response):
+    # A staged upload's URL is a 404 until its job publishes it, which must not be cached.
+    if (request.endpoint == 'static' and response.status_code < 400
+            and HASHED_UPLOAD_PATTERN.fullmatch(request.view_args.get('filename', ''))):
+        response.cache_control.no_cache = None
+        response.cache_control.public = True
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+        response.expires = int(time.time()) + 31536000
+    return response
+
+def save_image(image, path, image_format):
+    # Writing a fresh file from pixel data drops EXIF, GPS, ICC and comment blocks.
+    options = {'quality': app.config['IMAGE_QUALITY']}
+    if image_format == 'JPEG':
+        if image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        options.update(optimize=True, progressive=True)
+    elif image_format == 'PNG':
+        options = {'optimize': True}
+    elif image_format == 'WEBP':
+        options['method'] = 6
+    tmp_path = path + '.tmp'
+    image.save(tmp_path, image_format, **options)
+    os.replace(tmp_path, path)
+    return os.path.getsize(path)
+
+def prepare_image(source, target):
+    """Re-encode the image at source to target without metadata, at most IMAGE_MAX_WIDTH wide.
+
+    Returns the decoded, resized image, or None when source can't be decoded.
+    The original is kept in its own format as the <img src> fallback.
+    """
+    try:
+        with Image.open(source) as original:
+            image_format = original.format
+            image = ImageOps.exif_transpose(original)
+            image.load()
+    except (OSError, Image.DecompressionBombError) as e:
+        app.logger.warning('Could not process image %s: %s', source, e)
+        return None
+    if image_format not in ('JPEG', 'PNG', 'WEBP'):
+        image_format = 'PNG' if 'A' in image.getbands() else 'JPEG'
+
+    max_width = app.config['IMAGE_MAX_WIDTH']
+    if image.width > max_width:
+        image = image.resize((max_width, round(image.height * max_width / image.width)), Image.LANCZOS)
+    save_image(image, target, image_format)
+    return image
+
+def process_image(conn, folder, filename):
+    """Publish an upload without metadata, write WebP width variants next to it and record them in the media table.
+
+    Variants go to <folder>/derived/<stem>-<width>.webp. Staged uploads, and
+    older published files with no dimensions recorded yet, are re-encoded
+    first and published under their new hash, whose name is returned in the
+    info. Returns None when the image can't be decoded or was released meanwhile.
+    """
+    path = upload_path(folder, filename)
+    staged_path = staged_upload_path(folder, filename)
+    os.makedirs(os.path.join(app.config['UPLOAD_FOLDERS'][folder], 'derived'), exist_ok=True)
+    media = conn.execute('SELECT width FROM media WHERE folder = ? AND filename = ?', (folder, filename)).fetchone()
+    staged = os.path.exists(staged_path)
+    if staged or media is None or media['width'] is None:
+        # Rewriting a published file in place would change what its hashed URL
+        # serves, so the prepared copy is published under its own hash instead.
+        os.makedirs(app.config['UPLOAD_TEMP_FOLDER'], exist_ok=True)
+        prepared_path = os.path.join(app.config['UPLOAD_TEMP_FOLDER'], f'{os.path.basename(filename)}.prepared')
+        image = prepare_image(staged_path if staged else path, prepared_path)
+        if image is None:
+            return None
+        filename = rename_upload(conn, folder, filename, prepared_path, image, staged)
+        if filename is None:
+            return None
+        path = upload_path(folder, filename)
+    else:
+        try:
+            with Image.open(path) as original:
+                image = original.copy()
+        except (OSError, Image.DecompressionBombError) as e:
+            app.logger.warning('Could not process image %s: %s', path, e)
+            return None
+    size = os.path.getsize(path)
+
+    stem = os.path.splitext(filename)[0]
+    widths = [w for w in app.config['IMAGE_VARIANT_WIDTHS'] if w < image.width] + [image.width]
+    variants = []
+    for width in widths:
+        variant = image if width == image.width else image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+        variant_filename = f'derived/{stem}-{width}.webp'
+        variant_size = save_image(variant, upload_path(folder, variant_filename), 'WEBP')
+        variants.append({'width': width, 'filename': variant_filename, 'bytes': variant_size})
+
+    conn.execute('''INSERT INTO media (folder, filename, width, height, bytes, variants) VALUES (?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (folder, filename) DO UPDATE SET width = excluded.width, height = excluded.height,
+                    bytes = excluded.bytes, variants = excluded.variants''',
+                 (folder, filename, image.width, image.height, size, json.dumps(variants)))
+    return {'filename': filename, 'width': image.width, 'height': image.height, 'bytes': size, 'variants': variants}
+
+def rename_upload(conn, folder, filename, prepared_path, image, staged=False):
+    """Publish prepared_path under its own hash in place of filename and return the new name.
+
+    Every row pointing at filename is moved over, and the old file, published
+    or staged, is released. Returns None, publishing nothing, when a staged
+    upload lost its last reference while it was being prepared.
+    """
+    digest = file_sha256(prepared_path)
+    new_filename = f'{digest}{os.path.splitext(filename)[1]}'
+    size = os.path.getsize(prepared_path)
+    # Under the write lock nothing can release the upload or start pointing
+    # at it until its references are moved.
+    conn.execute('BEGIN IMMEDIATE')
+    if staged and not conn.execute('SELECT 1 FROM media WHERE folder = ? AND filename = ? AND ref_count > 0',
+                                   (folder, filename)).fetchone():
+        conn.rollback()
+        os.remove(prepared_path)
+        return None
+    new_path = upload_path(folder, new_filename)
+    if os.path.exists(new_path):
+        os.remove(prepared_path)
+    else:
+        os.replace(prepared_path, new_path)
+    if new_filename == filename:
+        conn.execute('UPDATE media SET width = ?, height = ?, bytes = ? WHERE folder = ? AND filename = ?',
+                     (image.width, image.height, size, folder, filename))
+        if staged:
+            os.remove(staged_upload_path(folder, filename))
+        conn.commit()
+        return filename
+    ref_count = 0
+    for ref_folder, table, column in UPLOAD_REFERENCES:
+        if ref_folder == folder:
+            conn.execute(f'UPDATE {table} SET {column} = ? WHERE {column} = ?', (new_filename, filename))
+            ref_count += conn.execute(f'SELECT COUNT(*) FROM {table} WHERE {column} = ?', (new_filename,)).fetchone()[0]
+    conn.execute('''INSERT INTO media (folder, filename, sha256, width, height, bytes, ref_count) VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (folder, filename) DO UPDATE SET ref_count = excluded.ref_count''',
+                 (folder, new_filename, digest, image.width, image.height, size, ref_count))
+    conn.execute('UPDATE media SET ref_count = 1 WHERE folder = ? AND filename = ?', (folder, filename))
+    delete_uploads(conn, [(folder, filename)])
+    conn.commit()
+    return new_filename
+
+def load_media(conn, references):
+    """Return {'folder/filename': media row} for the given (folder, filename) pairs."""
+    by_folder = {}
+    for folder, filename in references:
+        if filename:
+            by_folder.setdefault(folder, set()).add(filename)
+    media = {}
+    for folder, filenames in by_folder.items():
+        filenames = sorted(filenames)
+        for start in range(0, len(filenames), 500):
+            chunk = filenames[start:start + 500]
+            rows = conn.execute(f'SELECT * FROM media WHERE folder = ? AND filename IN ({", ".join("?" * len(chunk))})',
+                                [folder] + chunk)
+            for row in rows:
+                info = dict(row)
+                info['variants'] = json.loads(row['variants'] or '[]')
+                media[f'{folder}/{row["filename"]}'] = info
+    return media
+
+@app.template_global()
+def image_attrs(media, folder, filename, sizes='100vw'):
+    info = media.get(f'{folder}/{filename}') if filename else None
+    if not info:
+        return ''
+    srcset = ', '.join(f"{url_for('static', filename='uploads/' + folder + '/' + v['filename'])} {v['width']}w"
+                       for v in info['variants'])
+    return Markup(f' srcset="{escape(srcset)}" sizes="{escape(sizes)}" width="{info["width"]}" height="{info["height"]}"')
+
+# `flask build-assets` copies every static file a template passes to asset_url()
+# into static/dist under a content-hashed name, with .gz/.br siblings, and maps
+# logical paths to hashed ones in static/dist/manifest.json. Without a build the
+# helper falls back to the plain static URL.
+ASSET_TEMPLATE_PATTERN = re.compile(r"asset_url\(\s*'([^']+)'\s*\)")
+CSS_URL_PATTERN = re.compile(r'''url\(\s*(['"]?)([^'")]+)\1\s*\)''')
+SOURCE_MAP_PATTERN = re.compile(r'\n?(//|/\*)# sourceMappingURL=[^\n]*')
+COMPRESSIBLE_ASSETS = ('.css', '.js', '.svg', '.json', '.ttf', '.eot')
+_asset_manifest = {'mtime': None, 'assets': {}}
+
+@app.template_global()
+def asset_url(path):
+    manifest_path = os.path.join(app.config['ASSET_DIST_FOLDER'], 'manifest.json')
+    try:
+        mtime = os.stat(manifest_path).st_mtime_ns
+    except FileNotFoundError:
+        mtime = None
+    if mtime != _asset_manifest['mtime']:
+        assets = {}
+        if mtime is not None:
+            with open(manifest_path) as f:
+                assets = json.load(f)
+        _asset_manifest.update(mtime=mtime, assets=assets)
+    hashed = _asset_manifest['assets'].get(path)
+    if hashed:
+        return url_for('dist_asset', filename=hashed)
+    return url_for('static', filename=path)
+
+@app.route('/static/dist/<path:filename>')
+def dist_asset(filename):
+    dist = app.config['ASSET_DIST_FOLDER']
+    encoding, served = None, filename
+    for candidate, suffix in (('br', '.br'), ('gzip', '.gz')):
+        path = safe_join(dist, filename + suffix)
+        if request.accept_encodings[candidate] and path and os.path.isfile(path):
+            encoding, served = candidate, filename + suffix
+            break
+    response = send_from_directory(dist, served, mimetype=mimetypes.guess_type(filename)[0], max_age=31536000)
+    if encoding:
+        response.content_encoding = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.immutable = True
+    return response
+
+def write_file_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def fingerprint_asset(path, built):
+    """Write static/<path> to the dist folder under a content-hashed name and return that name.
+
+    Stylesheets are rewritten first so url() references point at the hashed
+    copies of the fonts and images they load; source map comments are dropped.
+    """
+    if path in built:
+        return built[path]
+    with open(os.path.join(app.static_folder, path), 'rb') as f:
+        data = f.read()
+    if path.endswith(('.css', '.js')):
+        text = SOURCE_MAP_PATTERN.sub('', data.decode('utf-8'))
+        if path.endswith('.css'):
+            directory = posixpath.dirname(path) or '.'
+
+            def rewrite(match):
+                url = match.group(2).strip()
+                if re.match(r'(data:|[a-z]+:|//|/|#)', url):
+                    return match.group(0)
+                reference = re.split(r'[?#]', url)[0]
+                fragment = url[url.index('#'):] if '#' in url else ''
+                dependency = posixpath.normpath(posixpath.join(directory, reference))
+                if not os.path.isfile(os.path.join(app.static_folder, dependency)):
+                    click.echo(f'missing  {dependency} (referenced from {path})', err=True)
+                    return match.group(0)
+                return f'url("{posixpath.relpath(fingerprint_asset(dependency, built), directory)}{fragment}")'
+
+            text = CSS_URL_PATTERN.sub(rewrite, text)
+        data = text.encode('utf-8')
+    stem, ext = posixpath.splitext(path)
+    hashed = f'{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}'
+    target = os.path.join(app.config['ASSET_DIST_FOLDER'], hashed)
+    if not os.path.exists(target):
+        write_file_atomic(target, data)
+        if ext in COMPRESSIBLE_ASSETS:
+            compressed = gzip.compress(data, 9, mtime=0)
+            if len(compressed) < len(data):
+                write_file_atomic(target + '.gz', compressed)
+            if brotli is not None:
+                compressed = brotli.compress(data, quality=11)
+                if len(compressed) < len(data):
+                    write_file_atomic(target + '.br', compressed)
+    built[path] = hashed
+    return hashed
 
 def hash_password(password):
     return hashlib.md5(password.encode()).hexdigest()
@@ -22,62 +597,931 @@ def hash_password(password):
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in app.config['ALLOWED_EXTENSIONS']
 
+def add_event_images(conn, event_id, filenames):
+    next_position = conn.execute('SELECT COALESCE(MAX(position) + 1, 0) FROM event_images WHERE event_id = ?',
+                                 (event_id,)).fetchone()[0]
+    rows = []
+    for offset, filename in enumerate(filenames):
+        media = conn.execute("SELECT width, height, bytes FROM media WHERE folder = 'events' AND filename = ?",
+                             (filename,)).fetchone()
+        if media:
+            width, height, size = media
+        else:
+            width = height = None
+            try:
+                size = os.path.getsize(upload_path('events', filename))
+            except OSError:
+                size = None
+        rows.append((event_id, filename, next_position + offset, width, height, size))
+    conn.executemany('INSERT INTO event_images (event_id, filename, position, width, height, bytes) VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+def get_event_images(conn, event_id):
+    return [row['filename'] for row in conn.execute(
+        'SELECT filename FROM event_images WHERE event_id = ? ORDER BY position', (event_id,))]
+
+# events.image_filenames used to hold str(list); only the migration reads it now.
+def parse_image_filenames(value):
+    if not value or value == '[]':
+        return []
+    filenames_str = value.strip('[]').replace("'", "").replace('"', '')
+    return [f.strip() for f in filenames_str.split(',') if f.strip()]
+
+def migrate_event_image_filenames(conn):
+    rows = []
+    for event_id, value in conn.execute('SELECT id, image_filenames FROM events').fetchall():
+        for position, filename in enumerate(parse_image_filenames(value)):
+            try:
+                size = os.path.getsize(os.path.join(app.config['UPLOAD_FOLDER_EVENTS'], filename))
+            except OSError:
+                size = None
+            rows.append((event_id, filename, position, size))
+    conn.executemany('INSERT INTO event_images (event_id, filename, position, bytes) VALUES (?, ?, ?, ?)', rows)
+
+def migrate_content_addressed_uploads(conn):
+    # The reference columns as they were when this migration was written.
+    references = [('hero', 'hero_section', 'image_filename'), ('about', 'about_section', 'image_filename'),
+                  ('schools', 'schools', 'logo_filename'), ('team', 'team_members', 'image_filename'),
+                  ('events', 'event_images', 'filename')]
+    renamed = {}
+    stale_paths = []
+    for folder, table, column in references:
+        directory = app.config['UPLOAD_FOLDERS'][folder]
+        for (filename,) in conn.execute(f'SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL').fetchall():
+            path = os.path.join(directory, filename)
+            if not os.path.exists(path):
+                continue
+            with open(path, 'rb') as f:
+                digest = hashlib.file_digest(f, 'sha256').hexdigest()
+            new_filename = digest + os.path.splitext(filename)[1].lower()
+            renamed[(folder, filename)] = (new_filename, digest)
+            if new_filename == filename:
+                continue
+            new_path = os.path.join(directory, new_filename)
+            if not os.path.exists(new_path):
+                shutil.copy2(path, new_path)
+            stale_paths.append(path)
+            conn.execute(f'UPDATE {table} SET {column} = ? WHERE {column} = ?', (new_filename, filename))
+
+    for folder, filename in renamed:
+        media = conn.execute('SELECT variants FROM media WHERE folder = ? AND filename = ?', (folder, filename)).fetchone()
+        if media and renamed[(folder, filename)][0] != filename:
+            if media['variants']:
+                stale_paths.extend(os.path.join(app.config['UPLOAD_FOLDERS'][folder], variant['filename'])
+                                   for variant in json.loads(media['variants']))
+            conn.execute('DELETE FROM media WHERE folder = ? AND filename = ?', (folder, filename))
+
+    ref_counts = {}
+    for folder, table, column in references:
+        for filename, count in conn.execute(f'SELECT {column}, COUNT(*) FROM {table} WHERE {column} IS NOT NULL GROUP BY {column}'):
+            ref_counts[(folder, filename)] = ref_counts.get((folder, filename), 0) + count
+    for (folder, filename), (new_filename, digest) in renamed.items():
+        if (folder, new_filename) not in ref_counts:
+            continue
+        processed = conn.execute('SELECT variants FROM media WHERE folder = ? AND filename = ?', (folder, new_filename)).fetchone()
+        conn.execute('''INSERT INTO media (folder, filename, sha256, ref_count) VALUES (?, ?, ?, ?)
+                        ON CONFLICT (folder, filename) DO UPDATE SET sha256 = excluded.sha256, ref_count = excluded.ref_count''',
+                     (folder, new_filename, digest, ref_counts.pop((folder, new_filename))))
+        if not (processed and processed['variants']):
+            conn.execute("INSERT INTO jobs (kind, payload) VALUES ('process_image', ?)",
+                         (json.dumps({'folder': folder, 'filename': new_filename}),))
+    if stale_paths:
+        conn.execute("INSERT INTO jobs (kind, payload) VALUES ('delete_files', ?)", (json.dumps({'paths': stale_paths}),))
+
+# Schema changes are applied in order and recorded in schema_version. A step is
+# either an SQL string or a callable taking the connection. Never edit a released
+# migration; append a new one instead.
+MIGRATIONS = [
+    (1, 'Initial schema', [
+        '''CREATE TABLE IF NOT EXISTS admin_users
+           (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, last_login TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS contact_messages
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT NOT NULL, message TEXT NOT NULL,
+           is_read BOOLEAN DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS schools
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, description TEXT NOT NULL, logo_filename TEXT,
+           website_link TEXT, is_active BOOLEAN DEFAULT 1, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS events
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, description TEXT NOT NULL, event_date DATE NOT NULL,
+           event_type TEXT NOT NULL, registration_link TEXT, image_filenames TEXT, is_active BOOLEAN DEFAULT 1,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS team_members
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, position TEXT NOT NULL, description TEXT NOT NULL,
+           image_filename TEXT, social_links TEXT, display_order INTEGER DEFAULT 0, is_active BOOLEAN DEFAULT 1,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS hero_section
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, agency_name TEXT NOT NULL, main_title TEXT NOT NULL,
+           description TEXT NOT NULL, button_text TEXT NOT NULL, image_filename TEXT, is_active BOOLEAN DEFAULT 1,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS about_section
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, main_title TEXT NOT NULL, lead_text TEXT NOT NULL,
+           description TEXT NOT NULL, image_filename TEXT, feature1_title TEXT NOT NULL, feature1_description TEXT NOT NULL,
+           feature2_title TEXT NOT NULL, feature2_description TEXT NOT NULL, is_active BOOLEAN DEFAULT 1,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        '''CREATE TABLE IF NOT EXISTS footer_section
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT NOT NULL, instagram_url TEXT, telegram_url TEXT,
+           youtube_url TEXT, tiktok_url TEXT, contact_email TEXT, is_active BOOLEAN DEFAULT 1,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+    ]),
+    (2, 'Indexes for listing, landing page and dashboard queries', [
+        'CREATE INDEX IF NOT EXISTS idx_events_date ON events (event_date)',
+        'CREATE INDEX IF NOT EXISTS idx_events_active_date ON events (event_date) WHERE is_active = 1',
+        "CREATE INDEX IF NOT EXISTS idx_events_upcoming_date ON events (event_date) WHERE event_type = 'upcoming' AND is_active = 1",
+        'CREATE INDEX IF NOT EXISTS idx_schools_created ON schools (created_at)',
+        'CREATE INDEX IF NOT EXISTS idx_schools_active_created ON schools (created_at) WHERE is_active = 1',
+        'CREATE INDEX IF NOT EXISTS idx_team_members_order ON team_members (display_order, created_at DESC)',
+        'CREATE INDEX IF NOT EXISTS idx_team_members_active_order ON team_members (display_order, created_at DESC) WHERE is_active = 1',
+        'CREATE INDEX IF NOT EXISTS idx_contact_messages_created ON contact_messages (created_at)',
+    ]),
+    (3, 'Move event images into event_images', [
+        '''CREATE TABLE IF NOT EXISTS event_images
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, event_id INTEGER NOT NULL REFERENCES events (id) ON DELETE CASCADE,
+           filename TEXT NOT NULL, position INTEGER NOT NULL DEFAULT 0, width INTEGER, height INTEGER, bytes INTEGER,
+           created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        'CREATE INDEX IF NOT EXISTS idx_event_images_event_position ON event_images (event_id, position)',
+        migrate_event_image_filenames,
+        'UPDATE events SET image_filenames = NULL',
+    ]),
+    (4, 'Keyset indexes for the messages inbox', [
+        'DROP INDEX IF EXISTS idx_contact_messages_created',
+        'CREATE INDEX IF NOT EXISTS idx_contact_messages_created_id ON contact_messages (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_contact_messages_read_created_id ON contact_messages (is_read, created_at, id)',
+    ]),
+    (5, 'Trigger-maintained dashboard counters', [
+        'CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER NOT NULL DEFAULT 0) WITHOUT ROWID',
+        '''CREATE TRIGGER IF NOT EXISTS trg_contact_messages_stats_insert AFTER INSERT ON contact_messages BEGIN
+           UPDATE stats SET value = value + 1 WHERE name = 'messages_total';
+           UPDATE stats SET value = value + (NEW.is_read = 0) WHERE name = 'messages_unread';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_contact_messages_stats_delete AFTER DELETE ON contact_messages BEGIN
+           UPDATE stats SET value = value - 1 WHERE name = 'messages_total';
+           UPDATE stats SET value = value - (OLD.is_read = 0) WHERE name = 'messages_unread';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_contact_messages_stats_update AFTER UPDATE OF is_read ON contact_messages BEGIN
+           UPDATE stats SET value = value + (NEW.is_read = 0) - (OLD.is_read = 0) WHERE name = 'messages_unread';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_schools_stats_insert AFTER INSERT ON schools BEGIN
+           UPDATE stats SET value = value + 1 WHERE name = 'schools_total';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_schools_stats_delete AFTER DELETE ON schools BEGIN
+           UPDATE stats SET value = value - 1 WHERE name = 'schools_total';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_events_stats_insert AFTER INSERT ON events BEGIN
+           UPDATE stats SET value = value + 1 WHERE name = 'events_total';
+           UPDATE stats SET value = value + (NEW.event_type = 'upcoming' AND NEW.is_active = 1) WHERE name = 'events_upcoming';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_events_stats_delete AFTER DELETE ON events BEGIN
+           UPDATE stats SET value = value - 1 WHERE name = 'events_total';
+           UPDATE stats SET value = value - (OLD.event_type = 'upcoming' AND OLD.is_active = 1) WHERE name = 'events_upcoming';
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_events_stats_update AFTER UPDATE OF event_type, is_active ON events BEGIN
+           UPDATE stats SET value = value + (NEW.event_type = 'upcoming' AND NEW.is_active = 1)
+                                          - (OLD.event_type = 'upcoming' AND OLD.is_active = 1) WHERE name = 'events_upcoming';
+           END''',
+        lambda conn: conn.executemany('INSERT OR REPLACE INTO stats (name, value) VALUES (?, ?)', compute_stats(conn).items()),
+    ]),
+    (6, 'Processed image metadata', [
+        '''CREATE TABLE IF NOT EXISTS media
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, folder TEXT NOT NULL, filename TEXT NOT NULL, width INTEGER, height INTEGER,
+           bytes INTEGER, variants TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, UNIQUE (folder, filename))''',
+    ]),
+    (7, 'Background job queue', [
+        '''CREATE TABLE IF NOT EXISTS jobs
+           (id INTEGER PRIMARY KEY AUTOINCREMENT, kind TEXT NOT NULL, payload TEXT NOT NULL DEFAULT '{}',
+           status TEXT NOT NULL DEFAULT 'queued', attempts INTEGER NOT NULL DEFAULT 0, max_attempts INTEGER NOT NULL DEFAULT 3,
+           error TEXT, run_after TIMESTAMP DEFAULT CURRENT_TIMESTAMP, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+           updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''',
+        'CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, id)',
+    ]),
+    (8, 'Content-addressed, reference-counted uploads', [
+        'ALTER TABLE media ADD COLUMN sha256 TEXT',
+        'ALTER TABLE media ADD COLUMN ref_count INTEGER NOT NULL DEFAULT 0',
+        migrate_content_addressed_uploads,
+    ]),
+    (9, 'Full-text search indexes', [
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS contact_messages_fts USING fts5(name, email, message, content='contact_messages', content_rowid='id',
+           tokenize='unicode61 remove_diacritics 2', prefix='2 3')''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_contact_messages_fts_insert AFTER INSERT ON contact_messages BEGIN
+           INSERT INTO contact_messages_fts (rowid, name, email, message) VALUES (NEW.id, NEW.name, NEW.email, NEW.message);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_contact_messages_fts_delete AFTER DELETE ON contact_messages BEGIN
+           INSERT INTO contact_messages_fts (contact_messages_fts, rowid, name, email, message) VALUES ('delete', OLD.id, OLD.name, OLD.email, OLD.message);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_contact_messages_fts_update AFTER UPDATE OF name, email, message ON contact_messages BEGIN
+           INSERT INTO contact_messages_fts (contact_messages_fts, rowid, name, email, message) VALUES ('delete', OLD.id, OLD.name, OLD.email, OLD.message);
+           INSERT INTO contact_messages_fts (rowid, name, email, message) VALUES (NEW.id, NEW.name, NEW.email, NEW.message);
+           END''',
+        "INSERT INTO contact_messages_fts (contact_messages_fts) VALUES ('rebuild')",
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(title, description, content='events', content_rowid='id',
+           tokenize='unicode61 remove_diacritics 2', prefix='2 3')''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_events_fts_insert AFTER INSERT ON events BEGIN
+           INSERT INTO events_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_events_fts_delete AFTER DELETE ON events BEGIN
+           INSERT INTO events_fts (events_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_events_fts_update AFTER UPDATE OF title, description ON events BEGIN
+           INSERT INTO events_fts (events_fts, rowid, title, description) VALUES ('delete', OLD.id, OLD.title, OLD.description);
+           INSERT INTO events_fts (rowid, title, description) VALUES (NEW.id, NEW.title, NEW.description);
+           END''',
+        "INSERT INTO events_fts (events_fts) VALUES ('rebuild')",
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS schools_fts USING fts5(name, description, content='schools', content_rowid='id',
+           tokenize='unicode61 remove_diacritics 2', prefix='2 3')''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_schools_fts_insert AFTER INSERT ON schools BEGIN
+           INSERT INTO schools_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_schools_fts_delete AFTER DELETE ON schools BEGIN
+           INSERT INTO schools_fts (schools_fts, rowid, name, description) VALUES ('delete', OLD.id, OLD.name, OLD.description);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_schools_fts_update AFTER UPDATE OF name, description ON schools BEGIN
+           INSERT INTO schools_fts (schools_fts, rowid, name, description) VALUES ('delete', OLD.id, OLD.name, OLD.description);
+           INSERT INTO schools_fts (rowid, name, description) VALUES (NEW.id, NEW.name, NEW.description);
+           END''',
+        "INSERT INTO schools_fts (schools_fts) VALUES ('rebuild')",
+        '''CREATE VIRTUAL TABLE IF NOT EXISTS team_members_fts USING fts5(name, position, description, content='team_members', content_rowid='id',
+           tokenize='unicode61 remove_diacritics 2', prefix='2 3')''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_team_members_fts_insert AFTER INSERT ON team_members BEGIN
+           INSERT INTO team_members_fts (rowid, name, position, description) VALUES (NEW.id, NEW.name, NEW.position, NEW.description);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_team_members_fts_delete AFTER DELETE ON team_members BEGIN
+           INSERT INTO team_members_fts (team_members_fts, rowid, name, position, description) VALUES ('delete', OLD.id, OLD.name, OLD.position, OLD.description);
+           END''',
+        '''CREATE TRIGGER IF NOT EXISTS trg_team_members_fts_update AFTER UPDATE OF name, position, description ON team_members BEGIN
+           INSERT INTO team_members_fts (team_members_fts, rowid, name, position, description) VALUES ('delete', OLD.id, OLD.name, OLD.position, OLD.description);
+           INSERT INTO team_members_fts (rowid, name, position, description) VALUES (NEW.id, NEW.name, NEW.position, NEW.description);
+           END''',
+        "INSERT INTO team_members_fts (team_members_fts) VALUES ('rebuild')",
+    ]),
+    (10, 'Indexes for the public JSON API', [
+        'CREATE INDEX IF NOT EXISTS idx_events_updated ON events (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_schools_updated ON schools (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_team_members_updated ON team_members (updated_at)',
+        'CREATE INDEX IF NOT EXISTS idx_team_members_active_order_id ON team_members (display_order, id) WHERE is_active = 1',
+    ]),
+    (11, 'Indexes for upload reference lookups', [
+        'CREATE INDEX IF NOT EXISTS idx_event_images_filename ON event_images (filename)',
+        'CREATE INDEX IF NOT EXISTS idx_schools_logo ON schools (logo_filename)',
+        'CREATE INDEX IF NOT EXISTS idx_team_members_image ON team_members (image_filename)',
+    ]),
+]
+
+# Counters kept in the stats table, with the query that recomputes each one.
+STATS_QUERIES = {
+    'messages_total': 'SELECT COUNT(*) FROM contact_messages',
+    'messages_unread': 'SELECT COUNT(*) FROM contact_messages WHERE is_read = 0',
+    'schools_total': 'SELECT COUNT(*) FROM schools',
+    'events_total': 'SELECT COUNT(*) FROM events',
+    'events_upcoming': "SELECT COUNT(*) FROM events WHERE event_type = 'upcoming' AND is_active = 1",
+}
+
+def compute_stats(conn):
+    return {name: conn.execute(query).fetchone()[0] for name, query in STATS_QUERIES.items()}
+
+def get_stats(conn):
+    return {row[0]: row[1] for row in conn.execute('SELECT name, value FROM stats')}
+
+def run_migrations(conn):
+    # Callers pass plain connections; migration steps read columns by name.
+    conn.row_factory = sqlite3.Row
+    conn.execute('''CREATE TABLE IF NOT EXISTS schema_version
+                    (version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
+    conn.commit()
+    applied = []
+    for version, description, steps in MIGRATIONS:
+        # BEGIN IMMEDIATE serialises workers that boot at the same time; the
+        # version is re-checked once the write lock is held.
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if conn.execute('SELECT 1 FROM schema_version WHERE version = ?', (version,)).fetchone():
+                conn.rollback()
+                continue
+            for step in steps:
+                if callable(step):
+                    step(conn)
+                else:
+                    conn.execute(step)
+            conn.execute('INSERT INTO schema_version (version, description) VALUES (?, ?)', (version, description))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        applied.append(version)
+    # user_version lives in the file header, so schema_is_current() can check it
+    # without reading any table.
+    conn.execute(f'PRAGMA user_version = {MIGRATIONS[-1][0]}')
+    conn.commit()
+    return applied
+
 def init_db():
-    conn = sqlite3.connect('site.db')
-    c = conn.cursor()
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS admin_users
-                 (id INTEGER PRIMARY KEY, username TEXT UNIQUE, password TEXT, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, last_login TIMESTAMP)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS contact_messages
-                (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, email TEXT NOT NULL, message TEXT NOT NULL,
-                is_read BOOLEAN DEFAULT 0, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS schools
-                (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, description TEXT NOT NULL, logo_filename TEXT,
-                website_link TEXT, is_active BOOLEAN DEFAULT 1, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS events
-                (id INTEGER PRIMARY KEY AUTOINCREMENT, title TEXT NOT NULL, description TEXT NOT NULL, event_date DATE NOT NULL,
-                event_type TEXT NOT NULL, registration_link TEXT, image_filenames TEXT, is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS team_members
-                (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT NOT NULL, position TEXT NOT NULL, description TEXT NOT NULL,
-                image_filename TEXT, social_links TEXT, display_order INTEGER DEFAULT 0, is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-
-    c.execute('''CREATE TABLE IF NOT EXISTS hero_section
-                (id INTEGER PRIMARY KEY AUTOINCREMENT, agency_name TEXT NOT NULL, main_title TEXT NOT NULL,
-                description TEXT NOT NULL, button_text TEXT NOT NULL, image_filename TEXT, is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS about_section
-                (id INTEGER PRIMARY KEY AUTOINCREMENT, main_title TEXT NOT NULL, lead_text TEXT NOT NULL,
-                description TEXT NOT NULL, image_filename TEXT, feature1_title TEXT NOT NULL, feature1_description TEXT NOT NULL,
-                feature2_title TEXT NOT NULL, feature2_description TEXT NOT NULL, is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
-    c.execute('''CREATE TABLE IF NOT EXISTS footer_section
-                (id INTEGER PRIMARY KEY AUTOINCREMENT, description TEXT NOT NULL, instagram_url TEXT, telegram_url TEXT,
-                youtube_url TEXT, tiktok_url TEXT, contact_email TEXT, is_active BOOLEAN DEFAULT 1,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
-    
+    for directory in list(app.config['UPLOAD_FOLDERS'].values()) + [app.config['UPLOAD_TEMP_FOLDER'], app.config['UPLOAD_STAGING_FOLDER']]:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(app.config['DATABASE'])
+    conn.execute('PRAGMA journal_mode = WAL')
+    applied = run_migrations(conn)
+
     default_username = "admin"
     default_password = hash_password("admin123")
-    c.execute('INSERT OR IGNORE INTO admin_users (username, password) VALUES (?, ?)', (default_username, default_password))
+    conn.execute('INSERT OR IGNORE INTO admin_users (username, password) VALUES (?, ?)', (default_username, default_password))
     
     conn.commit()
     conn.close()
+    return applied
 
-init_db()
+def schema_is_current():
+    if not os.path.exists(app.config['DATABASE']):
+        return False
+    conn = sqlite3.connect(app.config['DATABASE'])
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0] >= MIGRATIONS[-1][0]
+    finally:
+        conn.close()
 
-def get_db_connection():
-    conn = sqlite3.connect('site.db')
+# Deployments run `flask init-db` (or import the app once in the gunicorn master
+# with preload_app); a process that finds the schema current only reads the
+# header. A fresh checkout still bootstraps itself on first import.
+if not schema_is_current():
+    init_db()
+
+# Request instrumentation: per-endpoint latency histograms plus SQL, template and
+# upload time, kept in process memory. Totals for the current request live in a
+# thread-local so the hot paths only pay for a perf_counter() call and an add.
+# Every gunicorn worker keeps its own numbers; /admin/metrics reports the worker
+# that serves it.
+METRIC_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+_request_timings = threading.local()
+_metrics = {'requests': {}, 'upload_bytes': 0, 'upload_seconds': 0.0}
+_metrics_lock = threading.Lock()
+
+class InstrumentedConnection(sqlite3.Connection):
+    def execute(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().execute(*args)
+        finally:
+            record_query(time.perf_counter() - start)
+
+    def executemany(self, *args):
+        start = time.perf_counter()
+        try:
+            return super().executemany(*args)
+        finally:
+            record_query(time.perf_counter() - start)
+
+def record_query(elapsed):
+    timings = getattr(_request_timings, 'current', None)
+    if timings is not None:
+        timings['db'] += elapsed
+        timings['queries'] += 1
+
+def record_upload(size, elapsed):
+    timings = getattr(_request_timings, 'current', None)
+    if timings is not None:
+        timings['upload'] += elapsed
+    with _metrics_lock:
+        _metrics['upload_bytes'] += size
+        _metrics['upload_seconds'] += elapsed
+
+@before_render_template.connect_via(app)
+def start_template_timer(sender, template, context, **extra):
+    timings = getattr(_request_timings, 'current', None)
+    if timings is not None:
+        timings['template_start'] = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def stop_template_timer(sender, template, context, **extra):
+    timings = getattr(_request_timings, 'current', None)
+    if timings is not None and 'template_start' in timings:
+        timings['template'] += time.perf_counter() - timings.pop('template_start')
+
+@app.before_request
+def start_request_timer():
+    _request_timings.current = {'start': time.perf_counter(), 'db': 0.0, 'queries': 0, 'template': 0.0, 'upload': 0.0}
+
+@app.after_request
+def record_request_metrics(response):
+    timings = getattr(_request_timings, 'current', None)
+    if timings is None:
+        return response
+    _request_timings.current = None
+    elapsed = time.perf_counter() - timings['start']
+    endpoint = request.endpoint or 'unmatched'
+    with _metrics_lock:
+        stats = _metrics['requests'].get(endpoint)
+        if stats is None:
+            stats = _metrics['requests'][endpoint] = {'buckets': [0] * (len(METRIC_BUCKETS) + 1), 'count': 0, 'seconds': 0.0,
+                                                       'statuses': {}, 'queries': 0, 'db_seconds': 0.0, 'template_seconds': 0.0}
+        stats['buckets'][bisect.bisect_left(METRIC_BUCKETS, elapsed)] += 1
+        stats['count'] += 1
+        stats['seconds'] += elapsed
+        stats['statuses'][response.status_code] = stats['statuses'].get(response.status_code, 0) + 1
+        stats['queries'] += timings['queries']
+        stats['db_seconds'] += timings['db']
+        stats['template_seconds'] += timings['template']
+    if app.config['SERVER_TIMING']:
+        parts = [f'app;dur={elapsed * 1000:.1f}', f'db;dur={timings["db"] * 1000:.1f};desc="{timings["queries"]} queries"']
+        if timings['template']:
+            parts.append(f'tpl;dur={timings["template"] * 1000:.1f}')
+        if timings['upload']:
+            parts.append(f'upload;dur={timings["upload"] * 1000:.1f}')
+        response.headers['Server-Timing'] = ', '.join(parts)
+    return response
+
+@app.teardown_request
+def clear_request_timer(exc):
+    _request_timings.current = None
+
+def render_metrics():
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(f'{name}{labels} {value}' for labels, value in samples)
+
+    with _metrics_lock:
+        requests = {endpoint: dict(stats, buckets=list(stats['buckets']), statuses=dict(stats['statuses']))
+                    for endpoint, stats in _metrics['requests'].items()}
+        upload_bytes, upload_seconds = _metrics['upload_bytes'], _metrics['upload_seconds']
+
+    lines.append('# HELP ahss_request_duration_seconds Time spent handling requests.')
+    lines.append('# TYPE ahss_request_duration_seconds histogram')
+    for endpoint, stats in sorted(requests.items()):
+        cumulative = 0
+        for bound, count in zip(METRIC_BUCKETS + ('+Inf',), stats['buckets']):
+            cumulative += count
+            lines.append(f'ahss_request_duration_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {cumulative}')
+        lines.append(f'ahss_request_duration_seconds_sum{{endpoint="{endpoint}"}} {stats["seconds"]:.6f}')
+        lines.append(f'ahss_request_duration_seconds_count{{endpoint="{endpoint}"}} {stats["count"]}')
+    metric('ahss_requests_total', 'counter', 'Responses by endpoint and status code.',
+           [(f'{{endpoint="{endpoint}",status="{status}"}}', count)
+            for endpoint, stats in sorted(requests.items()) for status, count in sorted(stats['statuses'].items())])
+    metric('ahss_db_queries_total', 'counter', 'SQL statements executed while handling requests.',
+           [(f'{{endpoint="{endpoint}"}}', stats['queries']) for endpoint, stats in sorted(requests.items())])
+    metric('ahss_db_query_seconds_total', 'counter', 'Time spent executing SQL statements while handling requests.',
+           [(f'{{endpoint="{endpoint}"}}', f'{stats["db_seconds"]:.6f}') for endpoint, stats in sorted(requests.items())])
+    metric('ahss_template_render_seconds_total', 'counter', 'Time spent rendering templates.',
+           [(f'{{endpoint="{endpoint}"}}', f'{stats["template_seconds"]:.6f}') for endpoint, stats in sorted(requests.items())])
+    metric('ahss_upload_bytes_total', 'counter', 'Bytes received in file uploads.', [('', upload_bytes)])
+    metric('ahss_upload_seconds_total', 'counter', 'Time spent receiving and writing file uploads.', [('', f'{upload_seconds:.6f}')])
+    return '\n'.join(lines) + '\n'
+
+# Each worker thread keeps one open connection for its lifetime. The connection is
+# checked out into the app context and handed back on teardown, so routes never
+# open or close connections themselves.
+_db_local = threading.local()
+_db_connections = []
+_db_connections_lock = threading.Lock()
+
+def connect_db():
+    # Connections are only ever used by the thread that opened them; the check is
+    # relaxed so close_db_connections() can close them from the exiting thread.
+    conn = sqlite3.connect(app.config['DATABASE'], timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+                           check_same_thread=False, factory=InstrumentedConnection)
     conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA synchronous = NORMAL')
+    conn.execute(f"PRAGMA cache_size = -{int(app.config['SQLITE_CACHE_SIZE_KB'])}")
+    conn.execute(f"PRAGMA mmap_size = {int(app.config['SQLITE_MMAP_SIZE'])}")
+    conn.execute('PRAGMA temp_store = MEMORY')
+    conn.execute('PRAGMA foreign_keys = ON')
+    return conn
+
+def get_db_connection():
+    if 'db' in g:
+        return g.db
+    conn = getattr(_db_local, 'conn', None)
+    # A connection inherited across fork() must never be used by the child.
+    if conn is None or _db_local.pid != os.getpid():
+        conn = connect_db()
+        _db_local.conn = conn
+        _db_local.pid = os.getpid()
+        with _db_connections_lock:
+            _db_connections.append((os.getpid(), conn))
+    g.db = conn
     return conn
 
+@app.teardown_appcontext
+def release_db_connection(exc):
+    conn = g.pop('db', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+    if g.pop('jobs_enqueued', False):
+        _jobs_wakeup.set()
+
+@atexit.register
+def close_db_connections():
+    with _db_connections_lock:
+        while _db_connections:
+            pid, conn = _db_connections.pop()
+            if pid == os.getpid():
+                conn.close()
+
+# Token buckets for rate_limited routes live in their own small database, so
+# bots hammering a form never queue behind (or hold) the site database's write
+# lock, and every gunicorn worker sees the same buckets. A client that has been
+# refused is remembered in-process until its Retry-After passes and is turned
+# away again without touching either database.
+_rate_limit_local = threading.local()
+_rate_limit_blocked = {}
+
+def connect_rate_limit_db():
+    conn = getattr(_rate_limit_local, 'conn', None)
+    if conn is not None and _rate_limit_local.pid == os.getpid():
+        return conn
+    conn = sqlite3.connect(app.config['RATE_LIMIT_DATABASE'], timeout=app.config['SQLITE_BUSY_TIMEOUT'],
+                           isolation_level=None, check_same_thread=False)
+    conn.execute('PRAGMA journal_mode = WAL')
+    # Losing buckets in a crash only forgives a few requests.
+    conn.execute('PRAGMA synchronous = OFF')
+    conn.execute('CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL) WITHOUT ROWID')
+    _rate_limit_local.conn = conn
+    _rate_limit_local.pid = os.getpid()
+    _rate_limit_local.pruned = time.time()
+    with _db_connections_lock:
+        _db_connections.append((os.getpid(), conn))
+    return conn
+
+def take_token(key, burst, seconds):
+    """Take one token from key's bucket; return 0 if granted, else the seconds until one is available."""
+    rate = burst / seconds
+    conn = connect_rate_limit_db()
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        now = time.time()
+        row = conn.execute('SELECT tokens, updated FROM buckets WHERE key = ?', (key,)).fetchone()
+        tokens = burst if row is None else min(burst, row[0] + max(0.0, now - row[1]) * rate)
+        granted = tokens >= 1
+        if granted:
+            tokens -= 1
+        conn.execute('INSERT OR REPLACE INTO buckets (key, tokens, updated) VALUES (?, ?, ?)', (key, tokens, now))
+        # A bucket untouched for a full refill period is as good as a new one.
+        if now - _rate_limit_local.pruned > 60:
+            longest = max(seconds for _, seconds in app.config['RATE_LIMITS'].values())
+            conn.execute('DELETE FROM buckets WHERE updated < ?', (now - longest,))
+            _rate_limit_local.pruned = now
+        conn.execute('COMMIT')
+    except BaseException:
+        conn.execute('ROLLBACK')
+        raise
+    return 0 if granted else (1 - tokens) / rate
+
+def rate_limited(name):
+    """Limit POSTs to the route per client address by RATE_LIMITS[name], answering 429 with Retry-After."""
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if request.method == 'POST' and app.config['RATE_LIMIT_ENABLED']:
+                key = f'{name}:{request.remote_addr}'
+                now = time.time()
+                retry_after = _rate_limit_blocked.get(key, 0) - now
+                if retry_after <= 0:
+                    burst, seconds = app.config['RATE_LIMITS'][name]
+                    retry_after = take_token(key, burst, seconds)
+                    if retry_after:
+                        if len(_rate_limit_blocked) > 10000:
+                            for blocked_key, until in list(_rate_limit_blocked.items()):
+                                if until <= now:
+                                    _rate_limit_blocked.pop(blocked_key, None)
+                        _rate_limit_blocked[key] = now + retry_after
+                if retry_after > 0:
+                    raise TooManyRequests(retry_after=math.ceil(retry_after))
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
+
+@app.errorhandler(TooManyRequests)
+def too_many_requests(e):
+    if request.endpoint == 'admin_login':
+        flash(f'Too many login attempts. Please try again in {e.retry_after} seconds.', 'error')
+        return render_template('admin/login.html'), 429, {'Retry-After': str(e.retry_after)}
+    return e
+
+# Slow work (image processing, file cleanup) runs outside the request thread. Jobs
+# are rows in the jobs table, written in the same transaction as the change that
+# needs them, and drained by worker threads started in each app process (see
+# JOB_WORKERS) or by a dedicated `flask run-jobs` process.
+JOB_HANDLERS = {}
+_jobs_wakeup = threading.Event()
+_job_workers = {'pid': None, 'threads': []}
+_job_workers_lock = threading.Lock()
+
+def job_handler(kind):
+    def decorator(f):
+        JOB_HANDLERS[kind] = f
+        return f
+    return decorator
+
+def enqueue_job(conn, kind, **payload):
+    cursor = conn.execute('INSERT INTO jobs (kind, payload) VALUES (?, ?)', (kind, json.dumps(payload)))
+    if has_app_context():
+        g.jobs_enqueued = True
+    return cursor.lastrowid
+
+def claim_job(conn):
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        job = conn.execute("SELECT * FROM jobs WHERE status = 'queued' AND run_after <= CURRENT_TIMESTAMP ORDER BY id LIMIT 1").fetchone()
+        if job:
+            conn.execute("UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (job['id'],))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return job
+
+def run_job(conn, job):
+    try:
+        handler = JOB_HANDLERS.get(job['kind'])
+        if handler is None:
+            raise LookupError(f"No handler for job kind {job['kind']!r}")
+        handler(conn, **json.loads(job['payload']))
+        conn.commit()
+        conn.execute("UPDATE jobs SET status = 'done', error = NULL, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (job['id'],))
+    except Exception as e:
+        conn.rollback()
+        app.logger.exception('Job %s (%s) failed', job['id'], job['kind'])
+        if job['attempts'] + 1 < job['max_attempts']:
+            delay = app.config['JOB_RETRY_DELAY'] * (job['attempts'] + 1)
+            conn.execute("UPDATE jobs SET status = 'queued', error = ?, run_after = datetime('now', ?), updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                         (repr(e), f'+{delay} seconds', job['id']))
+        else:
+            conn.execute("UPDATE jobs SET status = 'failed', error = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?", (repr(e), job['id']))
+    conn.commit()
+
+def maintain_jobs(conn):
+    # Jobs left 'running' by a worker that died are retried; old finished jobs are dropped.
+    conn.execute("UPDATE jobs SET status = 'queued', updated_at = CURRENT_TIMESTAMP WHERE status = 'running' AND updated_at < datetime('now', ?)",
+                 (f"-{app.config['JOB_STALE_AFTER_MINUTES']} minutes",))
+    conn.execute("DELETE FROM jobs WHERE status = 'done' AND updated_at < datetime('now', ?)",
+                 (f"-{app.config['JOB_KEEP_DAYS']} days",))
+    # The DELETE above holds the write lock, so only one process enqueues each periodic job.
+    for kind, hours in app.config['PERIODIC_JOBS'].items():
+        if not conn.execute("SELECT 1 FROM jobs WHERE kind = ? AND (status IN ('queued', 'running') OR created_at > datetime('now', ?))",
+                            (kind, f'-{hours} hours')).fetchone():
+            enqueue_job(conn, kind)
+    conn.commit()
+
+def work_jobs(stop=None, burst=False):
+    with app.app_context():
+        conn = get_db_connection()
+        last_maintenance = 0
+        while not (stop and stop.is_set()):
+            try:
+                if time.monotonic() - last_maintenance > 60:
+                    maintain_jobs(conn)
+                    last_maintenance = time.monotonic()
+                job = claim_job(conn)
+                if job:
+                    run_job(conn, job)
+                    continue
+            except Exception:
+                # e.g. "database is locked" while a restore or long migration
+                # holds the write lock; the worker backs off instead of dying.
+                if conn.in_transaction:
+                    conn.rollback()
+                if burst:
+                    raise
+                app.logger.exception('Job worker %s failed to poll for jobs; retrying', threading.current_thread().name)
+                time.sleep(app.config['JOB_POLL_INTERVAL'])
+                continue
+            if burst:
+                return
+            _jobs_wakeup.wait(app.config['JOB_POLL_INTERVAL'])
+            _jobs_wakeup.clear()
+
+def start_job_workers():
+    # Threads do not survive fork(), so each worker process starts its own, and
+    # a thread that died anyway is replaced.
+    # ensure_job_workers() reads the list without the lock, so it is only
+    # replaced once every thread in it has started.
+    with _job_workers_lock:
+        if _job_workers['pid'] != os.getpid():
+            threads = [None] * app.config['JOB_WORKERS']
+        else:
+            threads = list(_job_workers['threads'])
+        for i, thread in enumerate(threads):
+            if thread is None or not thread.is_alive():
+                thread = threading.Thread(target=work_jobs, name=f'job-worker-{i}', daemon=True)
+                thread.start()
+                threads[i] = thread
+        _job_workers['threads'] = threads
+        _job_workers['pid'] = os.getpid()
+
+@app.before_request
+def ensure_job_workers():
+    if _job_workers['pid'] != os.getpid() or not all(thread.is_alive() for thread in _job_workers['threads']):
+        start_job_workers()
+
+@job_handler('process_image')
+def process_image_job(conn, folder, filename):
+    # An upload released before its job ran must not get its media row back,
+    # or the queued delete_files job would take it as re-uploaded and keep it.
+    if not conn.execute('SELECT 1 FROM media WHERE folder = ? AND filename = ? AND ref_count > 0', (folder, filename)).fetchone():
+        return
+    if not os.path.exists(staged_upload_path(folder, filename)) and not os.path.exists(upload_path(folder, filename)):
+        return
+    info = process_image(conn, folder, filename)
+    if info and folder == 'events':
+        conn.execute('UPDATE event_images SET width = ?, height = ?, bytes = ? WHERE filename = ?',
+                     (info['width'], info['height'], info['bytes'], info['filename']))
+    conn.commit()
+    bump_content_generation()
+
+@job_handler('delete_files')
+def delete_files_job(conn, paths=(), folder=None, filename=None, uploads=()):
+    # Older jobs carry a single upload (or bare paths) instead of an uploads list.
+    uploads = list(uploads)
+    if paths:
+        uploads.append({'folder': folder, 'filename': filename, 'paths': paths})
+    # Under the write lock a re-upload of the same content either finished first,
+    # and the media row is back, or waits until the files are gone and rewrites them.
+    conn.execute('BEGIN IMMEDIATE')
+    for upload in uploads:
+        if upload['folder'] and conn.execute('SELECT 1 FROM media WHERE folder = ? AND filename = ?',
+                                             (upload['folder'], upload['filename'])).fetchone():
+            continue
+        for path in upload['paths']:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+    conn.commit()
+
+# With CONTACT_BUFFERED on, contact submissions are handed to one flusher thread
+# per process that inserts whatever has queued up in a single transaction. Each
+# request still waits for the commit that contains its row, so nothing is
+# acknowledged before it is on disk; a burst of N posts just costs one commit
+# instead of N. When the queue is full, submit_contact_message() raises queue.Full
+# after CONTACT_QUEUE_TIMEOUT so callers can shed load.
+_contact_buffer = {'pid': None, 'queue': None, 'stop': None, 'thread': None}
+_contact_buffer_lock = threading.Lock()
+
+def submit_contact_message(name, email, message):
+    if not app.config['CONTACT_BUFFERED']:
+        conn = get_db_connection()
+        conn.execute('INSERT INTO contact_messages (name, email, message) VALUES (?, ?, ?)', (name, email, message))
+        conn.commit()
+        return
+    if _contact_buffer['pid'] != os.getpid():
+        start_contact_flusher()
+    entry = {'row': (name, email, message), 'done': threading.Event(), 'error': None}
+    _contact_buffer['queue'].put(entry, timeout=app.config['CONTACT_QUEUE_TIMEOUT'])
+    entry['done'].wait()
+    if entry['error'] is not None:
+        raise entry['error']
+
+def start_contact_flusher():
+    with _contact_buffer_lock:
+        if _contact_buffer['pid'] == os.getpid():
+            return
+        _contact_buffer.update(pid=os.getpid(), queue=queue.Queue(app.config['CONTACT_QUEUE_SIZE']), stop=threading.Event())
+        _contact_buffer['thread'] = threading.Thread(target=flush_contact_messages, name='contact-flusher', daemon=True,
+                                                     args=(_contact_buffer['queue'], _contact_buffer['stop']))
+        _contact_buffer['thread'].start()
+
+def flush_contact_messages(pending, stop):
+    with app.app_context():
+        conn = get_db_connection()
+        while True:
+            try:
+                batch = [pending.get(timeout=0.5)]
+            except queue.Empty:
+                if stop.is_set():
+                    return
+                continue
+            deadline = time.monotonic() + app.config['CONTACT_BATCH_LINGER']
+            while len(batch) < app.config['CONTACT_BATCH_SIZE']:
+                try:
+                    batch.append(pending.get(timeout=max(0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            try:
+                conn.executemany('INSERT INTO contact_messages (name, email, message) VALUES (?, ?, ?)', [entry['row'] for entry in batch])
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                app.logger.exception('Could not store %d contact messages', len(batch))
+                for entry in batch:
+                    entry['error'] = e
+            for entry in batch:
+                entry['done'].set()
+
+@atexit.register
+def stop_contact_flusher():
+    # Drain whatever is still queued before the worker exits.
+    if _contact_buffer['pid'] == os.getpid():
+        _contact_buffer['stop'].set()
+        _contact_buffer['thread'].join(timeout=10)
+
+# Landing-page content only changes through the admin routes, so each worker keeps
+# a snapshot of it in memory. Workers agree on freshness through a generation token
+# stored in a small file that every admin write replaces; checking it is one stat().
+_content_generation = (None, None, None)
+_content_snapshot = (None, None)
+_content_lock = threading.Lock()
+_page_cache = {}
+_compressed_cache = {}
+_compressed_lock = threading.Lock()
+
+def bump_content_generation():
+    global _content_snapshot
+    path = app.config['CONTENT_GENERATION_FILE']
+    tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+    with open(tmp_path, 'w') as f:
+        f.write(f'{time.time_ns():x}-{os.getpid():x}')
+    os.replace(tmp_path, path)
+    _content_snapshot = (None, None)
+    _page_cache.clear()
+    _compressed_cache.clear()
+    if app.config['EXPORT_FOLDER'] and has_app_context():
+        request_site_export()
+
+def get_content_generation():
+    global _content_generation
+    path = app.config['CONTENT_GENERATION_FILE']
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        bump_content_generation()
+        st = os.stat(path)
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    if _content_generation[0] != key:
+        with open(path) as f:
+            _content_generation = (key, f.read().strip(), st.st_mtime)
+    return _content_generation[1]
+
+def build_content_snapshot():
+    conn = get_db_connection()
+    hero = conn.execute('SELECT * FROM hero_section WHERE is_active = 1').fetchone()
+    about = conn.execute('SELECT * FROM about_section WHERE is_active = 1').fetchone()
+    footer = conn.execute('SELECT * FROM footer_section WHERE is_active = 1').fetchone()
+    schools = conn.execute('SELECT * FROM schools WHERE is_active = 1 ORDER BY created_at DESC').fetchall()
+    team_members = conn.execute('SELECT * FROM team_members WHERE is_active = 1 ORDER BY display_order ASC, created_at DESC').fetchall()
+    # Only upcoming events and the latest past ones are rendered; older events
+    # come from /events/archive and galleries load when their modal opens.
+    upcoming = conn.execute("SELECT * FROM events WHERE is_active = 1 AND event_type = 'upcoming' ORDER BY event_date DESC").fetchall()
+    past, archive_cursor = past_events_page(conn, app.config['LANDING_PAST_EVENTS'])
+    events = event_timeline(conn, sorted(upcoming + past, key=lambda event: event['event_date'] or '', reverse=True))
+
+    media = load_media(conn, [('hero', hero and hero['image_filename']), ('about', about and about['image_filename'])]
+                             + [('schools', school['logo_filename']) for school in schools]
+                             + [('team', member['image_filename']) for member in team_members]
+                             + [('events', filename) for event in events for filename in event['preview_images']])
+
+    return {
+        'hero': dict(hero) if hero else None,
+        'about': dict(about) if about else None,
+        'footer': dict(footer) if footer else None,
+        'schools': [dict(school) for school in schools],
+        'events': events,
+        'archive_cursor': archive_cursor,
+        'team_members': [dict(member) for member in team_members],
+        'media': media,
+    }
+
+def past_events_page(conn, limit, cursor=None):
+    """Return up to limit active past events, newest first, and the cursor for the next page."""
+    condition, params = '', []
+    if cursor:
+        condition, params = 'AND (event_date, id) < (?, ?)', list(cursor)
+    events = conn.execute(f"SELECT * FROM events WHERE is_active = 1 AND event_type = 'past' {condition} "
+                          'ORDER BY event_date DESC, id DESC LIMIT ?', params + [limit + 1]).fetchall()
+    if len(events) <= limit:
+        return events, None
+    events = events[:limit]
+    return events, f"{events[-1]['event_date']}|{events[-1]['id']}"
+
+def event_timeline(conn, events):
+    """Return the events as dicts carrying their preview thumbnails and image count."""
+    preview_size = app.config['EVENT_PREVIEW_IMAGES']
+    images_by_event = {}
+    for image in conn.execute('SELECT event_id, filename FROM event_images WHERE event_id IN (SELECT value FROM json_each(?)) '
+                              'ORDER BY event_id, position', [json.dumps([event['id'] for event in events])]):
+        images_by_event.setdefault(image['event_id'], []).append(image['filename'])
+    timeline = []
+    for event in events:
+        event_dict = dict(event)
+        images = images_by_event.get(event['id'], [])
+        event_dict['preview_images'] = images[:preview_size]
+        event_dict['image_count'] = len(images)
+        timeline.append(event_dict)
+    return timeline
+
+def get_content_snapshot():
+    global _content_snapshot
+    generation = get_content_generation()
+    snapshot_generation, data = _content_snapshot
+    if snapshot_generation == generation:
+        return data
+    with _content_lock:
+        snapshot_generation, data = _content_snapshot
+        if snapshot_generation != generation:
+            # Read the generation before querying so a concurrent admin write
+            # can only make this snapshot look stale, never newer than it is.
+            data = build_content_snapshot()
+            _content_snapshot = (generation, data)
+    return data
+
 def admin_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -95,37 +1539,408 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+def cached_page(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        # A pending flash message is rendered into the page, so those requests
+        # always go through the view.
+        if '_flashes' in session:
+            return f(*args, **kwargs)
+
+        generation = get_content_generation()
+        entry = _page_cache.get(request.path)
+        if entry is None or entry['generation'] != generation:
+            response = make_response(f(*args, **kwargs))
+            if response.status_code != 200:
+                return response
+            body = response.get_data()
+            entry = {
+                'generation': generation,
+                'body': body,
+                'mimetype': response.mimetype,
+                'etag': hashlib.sha256(body).hexdigest()[:32],
+                'last_modified': _content_generation[2],
+            }
+            _page_cache[request.path] = entry
+
+        matched = matching_etag(entry['etag'])
+        if matched:
+            response = app.response_class(status=304)
+            response.set_etag(matched)
+        else:
+            response = app.response_class(entry['body'], mimetype=entry['mimetype'])
+            response.set_etag(entry['etag'])
+        response.last_modified = entry['last_modified']
+        response.cache_control.no_cache = True
+        return response if matched else response.make_conditional(request)
+    return decorated_function
+
+def invalidates_content(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        response = f(*args, **kwargs)
+        # GET on a form route only renders the form; everything else is a write.
+        if request.method != 'GET' or 'POST' not in request.url_rule.methods:
+            bump_content_generation()
+        return response
+    decorated_function.invalidates_content = True
+    return decorated_function
+
+# Contents of these elements are whitespace-sensitive and left alone by minify_html.
+RAW_TEXT_PATTERN = re.compile(rb'<(pre|textarea|script|style)\b.*?</\1\s*>', re.IGNORECASE | re.DOTALL)
+TAG_WHITESPACE_PATTERN = re.compile(rb'(?<=>)\s+|\s+(?=<)')
+
+def minify_html(body):
+    # Whitespace runs at tag boundaries render as at most one space, so
+    # collapsing them to one keeps the layout identical.
+    parts, pos = [], 0
+    for match in RAW_TEXT_PATTERN.finditer(body):
+        parts.append(TAG_WHITESPACE_PATTERN.sub(b' ', body[pos:match.start()]))
+        parts.append(match.group())
+        pos = match.end()
+    parts.append(TAG_WHITESPACE_PATTERN.sub(b' ', body[pos:]))
+    return b''.join(parts)
+
+def negotiate_encoding():
+    accept = request.accept_encodings
+    candidates = [('br', accept['br'])] if brotli is not None else []
+    candidates.append(('gzip', accept['gzip']))
+    encoding, quality = max(candidates, key=lambda candidate: candidate[1])
+    return encoding if quality > 0 else None
+
+def encode_body(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=app.config['COMPRESS_BROTLI_QUALITY'])
+    return gzip.compress(body, app.config['COMPRESS_GZIP_LEVEL'], mtime=0)
+
+def matching_etag(etag):
+    """Return the tag in If-None-Match that names etag, as is or with compress_response's encoding suffix."""
+    for tag in (etag, f'{etag}-gzip', f'{etag}-br'):
+        if request.if_none_match.contains_weak(tag):
+            return tag
+    return None
+
+@app.after_request
+def compress_response(response):
+    if (not app.config['COMPRESS_RESPONSES'] or response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 206, 304)
+            or response.mimetype not in app.config['COMPRESS_MIMETYPES'] or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < app.config['COMPRESS_MIN_SIZE']:
+        return response
+    response.vary.add('Accept-Encoding')
+    minify = app.config['MINIFY_HTML'] and response.mimetype == 'text/html'
+    encoding = negotiate_encoding()
+    if encoding is None and not minify:
+        return response
+
+    # Cached pages and API responses carry an ETag that identifies the body, so
+    # their encoded form is reused instead of recompressed on every hit.
+    etag = response.get_etag()[0]
+    key = (etag, encoding, minify) if etag else None
+    with _compressed_lock:
+        data = _compressed_cache.pop(key, None) if key else None
+        if data is not None:
+            _compressed_cache[key] = data
+    if data is None:
+        data = minify_html(body) if minify else body
+        if encoding:
+            data = encode_body(data, encoding)
+        if key:
+            with _compressed_lock:
+                _compressed_cache[key] = data
+                while len(_compressed_cache) > app.config['COMPRESS_CACHE_ENTRIES']:
+                    del _compressed_cache[next(iter(_compressed_cache))]
+
+    response.set_data(data)
+    if encoding:
+        response.content_encoding = encoding
+    if etag and encoding:
+        # Each encoding is its own byte sequence and gets its own strong ETag;
+        # matching_etag() maps it back for conditional requests.
+        response.set_etag(f'{etag}-{encoding}')
+    return response
+
 @app.before_request
 def make_session_permanent():
-    session.permanent = True
+    # Only admin sessions need the cookie refreshed; anonymous visitors get no
+    # Set-Cookie so their responses stay cacheable.
+    if 'admin_logged_in' in session:
+        session.permanent = True
 
 @app.route('/')
+@cached_page
 def index():
+    content = get_content_snapshot()
+    return render_template('main/index.html', **content)
+
+# Read-only JSON API over the public content. Lists are keyset-paginated with a
+# "<sort key>|<id>" cursor and ?fields= trims items to the named fields. The
+# ETag combines the tables' MAX(updated_at) with the content generation, which
+# also moves on deletes and image processing and within the same second.
+API_RESOURCES = {
+    'events': {
+        'table': 'events', 'key': 'event_date', 'folder': 'events',
+        'fields': {'id': 'id', 'title': 'title', 'description': 'description', 'event_date': 'event_date',
+                   'event_type': 'event_type', 'registration_link': 'registration_link', 'images': None,
+                   'updated_at': 'updated_at'},
+    },
+    'schools': {
+        'table': 'schools', 'key': 'created_at', 'folder': 'schools',
+        'fields': {'id': 'id', 'name': 'name', 'description': 'description', 'website_link': 'website_link',
+                   'logo': 'logo_filename', 'created_at': 'created_at', 'updated_at': 'updated_at'},
+        'images': ('logo',),
+    },
+    'team': {
+        'table': 'team_members', 'key': 'display_order', 'key_type': int, 'folder': 'team',
+        'fields': {'id': 'id', 'name': 'name', 'position': 'position', 'description': 'description',
+                   'social_links': 'social_links', 'image': 'image_filename', 'display_order': 'display_order',
+                   'updated_at': 'updated_at'},
+        'images': ('image',), 'json': ('social_links',),
+    },
+}
+API_SITE_SECTIONS = {
+    'hero': ('hero_section', 'hero', ('agency_name', 'main_title', 'description', 'button_text')),
+    'about': ('about_section', 'about', ('main_title', 'lead_text', 'description', 'feature1_title', 'feature1_description',
+                                         'feature2_title', 'feature2_description')),
+    'footer': ('footer_section', None, ('description', 'instagram_url', 'telegram_url', 'youtube_url', 'tiktok_url',
+                                        'contact_email')),
+}
+
+def api_error(message, status=400, **extra):
+    abort(make_response(jsonify(error=message, **extra), status))
+
+def public_endpoint(*tables):
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            conn = get_db_connection()
+            # Bodies carry absolute URLs, so the host is part of the representation.
+            validators = [get_content_generation(), request.host, request.full_path]
+            validators += [conn.execute(f'SELECT MAX(updated_at) FROM {table}').fetchone()[0] or '' for table in tables]
+            etag = hashlib.sha256('|'.join(validators).encode()).hexdigest()[:32]
+            matched = matching_etag(etag)
+            if matched:
+                response = app.response_class(status=304)
+            else:
+                response = make_response(f(*args, **kwargs))
+            response.set_etag(matched or etag)
+            response.last_modified = _content_generation[2]
+            response.headers['Cache-Control'] = (f"public, max-age={app.config['API_CACHE_MAX_AGE']}, "
+                                                 f"s-maxage={app.config['API_PROXY_MAX_AGE']}")
+            response.headers['Access-Control-Allow-Origin'] = '*'
+            return response
+        return decorated_function
+    return decorator
+
+def api_fields(available):
+    requested = request.args.get('fields', '')
+    if not requested:
+        return list(available)
+    fields = list(dict.fromkeys(field.strip() for field in requested.split(',') if field.strip()))
+    unknown = [field for field in fields if field not in available]
+    if unknown:
+        api_error(f"Unknown field(s): {', '.join(unknown)}", fields=list(available))
+    return fields
+
+def api_image(base_url, media, folder, filename):
+    if not filename:
+        return None
+    info = media.get(f'{folder}/{filename}', {})
+    return {
+        'url': f'{base_url}{folder}/{filename}',
+        'width': info.get('width'),
+        'height': info.get('height'),
+        'variants': [{'url': f"{base_url}{folder}/{variant['filename']}", 'width': variant['width']}
+                     for variant in info.get('variants', ())],
+    }
+
+def api_list(name, conditions=(), descending=False):
+    resource = API_RESOURCES[name]
+    fields = api_fields(resource['fields'])
+    key = resource['key']
+    limit = request.args.get('limit', app.config['API_PAGE_SIZE'], type=int)
+    limit = max(1, min(limit, app.config['API_MAX_PAGE_SIZE']))
+
+    conditions = ['is_active = 1'] + list(conditions)
+    params = []
+    cursor = request.args.get('cursor', '')
+    if cursor:
+        value, _, cursor_id = cursor.rpartition('|')
+        try:
+            params.extend([resource.get('key_type', str)(value), int(cursor_id)])
+        except ValueError:
+            api_error('Invalid cursor')
+        conditions.append(f'({key}, id) < (?, ?)' if descending else f'({key}, id) > (?, ?)')
+    order = 'DESC' if descending else 'ASC'
+    columns = dict.fromkeys(['id', key] + [resource['fields'][field] for field in fields if resource['fields'][field]])
+
     conn = get_db_connection()
-    hero = conn.execute('SELECT * FROM hero_section WHERE is_active = 1').fetchone()
-    about = conn.execute('SELECT * FROM about_section WHERE is_active = 1').fetchone()
-    footer = conn.execute('SELECT * FROM footer_section WHERE is_active = 1').fetchone()
-    schools = conn.execute('SELECT * FROM schools WHERE is_active = 1 ORDER BY created_at DESC').fetchall()
-    events = conn.execute('SELECT * FROM events WHERE is_active = 1 ORDER BY event_date DESC').fetchall()
-    team_members = conn.execute('SELECT * FROM team_members WHERE is_active = 1 ORDER BY display_order ASC, created_at DESC').fetchall()
-    conn.close()
-    
-    processed_events = []
-    for event in events:
-        event_dict = dict(event)
-        if event_dict['image_filenames'] and event_dict['image_filenames'] != '[]':
-            try:
-                filenames_str = event_dict['image_filenames'].strip('[]').replace("'", "").replace('"', '')
-                event_dict['processed_images'] = [f.strip() for f in filenames_str.split(',') if f.strip()]
-            except:
-                event_dict['processed_images'] = []
-        else:
-            event_dict['processed_images'] = []
-        processed_events.append(event_dict)
-    
-    return render_template('main/index.html', hero=hero, about=about, footer=footer, schools=schools, events=processed_events, team_members=team_members)
+    rows = conn.execute(f'SELECT {", ".join(columns)} FROM {resource["table"]} WHERE {" AND ".join(conditions)} '
+                        f'ORDER BY {key} {order}, id {order} LIMIT ?', params + [limit + 1]).fetchall()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    images_by_row = {}
+    references = []
+    if 'images' in fields and rows:
+        for image in conn.execute('SELECT event_id, filename FROM event_images WHERE event_id IN (SELECT value FROM json_each(?)) '
+                                  'ORDER BY event_id, position', [json.dumps([row['id'] for row in rows])]):
+            images_by_row.setdefault(image['event_id'], []).append(image['filename'])
+            references.append((resource['folder'], image['filename']))
+    image_fields = [field for field in resource.get('images', ()) if field in fields]
+    for field in image_fields:
+        references += [(resource['folder'], row[resource['fields'][field]]) for row in rows]
+    media = load_media(conn, references) if references else {}
+    base_url = url_for('static', filename='uploads/', _external=True)
+
+    items = []
+    for row in rows:
+        item = {}
+        for field in fields:
+            column = resource['fields'][field]
+            if field == 'images':
+                item[field] = [api_image(base_url, media, resource['folder'], filename)
+                               for filename in images_by_row.get(row['id'], [])]
+            elif field in image_fields:
+                item[field] = api_image(base_url, media, resource['folder'], row[column])
+            elif field in resource.get('json', ()):
+                item[field] = json.loads(row[column] or '{}')
+            else:
+                item[field] = row[column]
+        items.append(item)
+
+    next_cursor = f"{rows[-1][key]}|{rows[-1]['id']}" if has_more else None
+    return {
+        'data': items,
+        'next_cursor': next_cursor,
+        'next': url_for(request.endpoint, **dict(request.args.items(), cursor=next_cursor), _external=True) if next_cursor else None,
+    }
+
+@app.route('/api/v1/events')
+@public_endpoint('events')
+def api_events():
+    # Upcoming events read soonest first, everything else newest first.
+    event_type = request.args.get('type', 'all')
+    if event_type == 'upcoming':
+        return api_list('events', ["event_type = 'upcoming'"])
+    if event_type == 'past':
+        return api_list('events', ["event_type = 'past'"], descending=True)
+    if event_type != 'all':
+        api_error("type must be one of 'all', 'upcoming' or 'past'")
+    return api_list('events', descending=True)
+
+@app.route('/api/v1/schools')
+@public_endpoint('schools')
+def api_schools():
+    return api_list('schools', descending=True)
+
+@app.route('/api/v1/team')
+@public_endpoint('team_members')
+def api_team():
+    return api_list('team')
+
+@app.route('/api/v1/site')
+@public_endpoint(*(table for table, folder, columns in API_SITE_SECTIONS.values()))
+def api_site():
+    conn = get_db_connection()
+    base_url = url_for('static', filename='uploads/', _external=True)
+    site = {}
+    for name in api_fields(API_SITE_SECTIONS):
+        table, folder, columns = API_SITE_SECTIONS[name]
+        row = conn.execute(f'SELECT * FROM {table} WHERE is_active = 1').fetchone()
+        if row is None:
+            site[name] = None
+            continue
+        site[name] = {column: row[column] for column in columns}
+        if folder:
+            site[name]['image'] = api_image(base_url, load_media(conn, [(folder, row['image_filename'])]),
+                                            folder, row['image_filename'])
+        site[name]['updated_at'] = row['updated_at']
+    return site
+
+@app.route('/api/v1/events/<int:event_id>/images')
+@public_endpoint('events')
+def api_event_images(event_id):
+    conn = get_db_connection()
+    event = conn.execute('SELECT id, title FROM events WHERE id = ? AND is_active = 1', (event_id,)).fetchone()
+    if event is None:
+        api_error('Event not found', 404)
+    filenames = get_event_images(conn, event_id)
+    media = load_media(conn, [('events', filename) for filename in filenames])
+    base_url = url_for('static', filename='uploads/', _external=True)
+    return {'id': event['id'], 'title': event['title'],
+            'images': [api_image(base_url, media, 'events', filename) for filename in filenames]}
+
+@app.route('/events/archive')
+@public_endpoint('events')
+def events_archive():
+    value, _, cursor_id = request.args.get('cursor', '').rpartition('|')
+    if not value or not cursor_id.isdigit():
+        abort(400)
+    conn = get_db_connection()
+    events, archive_cursor = past_events_page(conn, app.config['EVENT_ARCHIVE_PAGE_SIZE'], (value, int(cursor_id)))
+    events = event_timeline(conn, events)
+    media = load_media(conn, [('events', filename) for event in events for filename in event['preview_images']])
+    return render_template('main/include/event_archive.html', events=events, media=media, archive_cursor=archive_cursor)
+
+# With EXPORT_FOLDER set, the public pages are also pre-rendered to static files
+# after every content change, for nginx or a CDN to serve without Python. Each
+# export is written to its own release directory and published by swapping the
+# EXPORT_FOLDER/current symlink, so readers never see a half-written site. A
+# release links static/ back to the app, so asset and upload URLs resolve as is.
+# Only visitors without a session cookie should get the export, e.g. in nginx:
+#
+#   location = / {
+#       if ($http_cookie ~ "session=") { proxy_pass http://app; }
+#       root /srv/ahss/export/current; try_files /index.html @app;
+#   }
+EXPORT_PAGES = {'index': 'index.html'}
+
+def export_site(folder):
+    """Render EXPORT_PAGES into a new release under folder, publish it as folder/current and return its path."""
+    releases = os.path.join(folder, 'releases')
+    release = os.path.join(releases, f'{time.time_ns():x}-{os.getpid():x}')
+    os.makedirs(release)
+    for endpoint, filename in EXPORT_PAGES.items():
+        with app.test_request_context():
+            path = url_for(endpoint)
+        with app.test_request_context(path):
+            body = make_response(app.view_functions[endpoint]()).get_data()
+        if app.config['MINIFY_HTML']:
+            body = minify_html(body)
+        target = os.path.join(release, filename)
+        write_file_atomic(target, body)
+        write_file_atomic(target + '.gz', gzip.compress(body, 9, mtime=0))
+        if brotli is not None:
+            write_file_atomic(target + '.br', brotli.compress(body, quality=11))
+    os.symlink(os.path.abspath(app.static_folder), os.path.join(release, 'static'))
+
+    current = os.path.join(folder, 'current')
+    tmp_link = f'{current}.{os.getpid()}.{threading.get_ident()}.tmp'
+    os.symlink(os.path.relpath(release, folder), tmp_link)
+    os.replace(tmp_link, current)
+    live = os.path.realpath(current)
+    for entry in os.scandir(releases):
+        if entry.path != release and os.path.realpath(entry.path) != live:
+            shutil.rmtree(entry.path, ignore_errors=True)
+    return release
+
+def request_site_export():
+    # A queued export renders whatever is current when it runs, so one is enough.
+    conn = get_db_connection()
+    if not conn.execute("SELECT 1 FROM jobs WHERE status = 'queued' AND kind = 'export_site'").fetchone():
+        enqueue_job(conn, 'export_site')
+        conn.commit()
+
+@job_handler('export_site')
+def export_site_job(conn):
+    if app.config['EXPORT_FOLDER']:
+        export_site(app.config['EXPORT_FOLDER'])
 
 @app.route('/admin/login', methods=['GET', 'POST'])
+@rate_limited('login')
 def admin_login():
     if 'admin_logged_in' in session:
         return redirect(url_for('admin_dashboard'))
@@ -145,8 +1960,8 @@ def admin_login():
         if user:
             conn.execute('UPDATE admin_users SET last_login = CURRENT_TIMESTAMP WHERE username = ?', (username,))
             conn.commit()
-            conn.close()
             
+            session.permanent = True
             session['admin_logged_in'] = True
             session['admin_username'] = username
             session['admin_id'] = user['id']
@@ -156,7 +1971,6 @@ def admin_login():
             flash('Login successful!', 'success')
             return redirect(url_for('admin_dashboard'))
         else:
-            conn.close()
             flash('Invalid username or password!', 'error')
     
     return render_template('admin/login.html')
@@ -188,11 +2002,9 @@ def change_password():
             new_hashed_password = hash_password(new_password)
             conn.execute('UPDATE admin_users SET password = ? WHERE id = ?', (new_hashed_password, session['admin_id']))
             conn.commit()
-            conn.close()
             flash('Password changed successfully!', 'success')
             return redirect(url_for('admin_dashboard'))
         else:
-            conn.close()
             flash('Current password is incorrect.', 'error')
     
     return render_template('admin/change_password.html')
@@ -201,20 +2013,17 @@ def change_password():
 @admin_required
 def admin_dashboard():
     conn = get_db_connection()
-    messages_count = conn.execute('SELECT COUNT(*) FROM contact_messages').fetchone()[0]
-    schools_count = conn.execute('SELECT COUNT(*) FROM schools').fetchone()[0]
-    events_count = conn.execute('SELECT COUNT(*) FROM events').fetchone()[0]
-    upcoming_events_count = conn.execute('SELECT COUNT(*) FROM events WHERE event_type = "upcoming" AND is_active = 1').fetchone()[0]
+    stats = get_stats(conn)
     recent_messages = conn.execute('SELECT * FROM contact_messages ORDER BY created_at DESC LIMIT 5').fetchall()
-    upcoming_events = conn.execute('SELECT * FROM events WHERE event_type = "upcoming" AND is_active = 1 ORDER BY event_date ASC LIMIT 3').fetchall()
-    conn.close()
+    upcoming_events = conn.execute("SELECT * FROM events WHERE event_type = 'upcoming' AND is_active = 1 ORDER BY event_date ASC LIMIT 3").fetchall()
     
-    return render_template('admin/dashboard.html', messages_count=messages_count, schools_count=schools_count,
-                         events_count=events_count, upcoming_events_count=upcoming_events_count,
+    return render_template('admin/dashboard.html', messages_count=stats['messages_total'], schools_count=stats['schools_total'],
+                         events_count=stats['events_total'], upcoming_events_count=stats['events_upcoming'],
                          recent_messages=recent_messages, upcoming_events=upcoming_events)
 
 @app.route('/admin/hero', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def admin_hero():
     conn = get_db_connection()
     if request.method == 'POST':
@@ -223,18 +2032,11 @@ def admin_hero():
         description = request.form['description']
         button_text = request.form['button_text']
         
-        image_filename = None
-        if 'hero_image' in request.files:
-            file = request.files['hero_image']
-            if file and file.filename != '' and allowed_file(file.filename):
-                os.makedirs('static/uploads/hero', exist_ok=True)
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                filename = timestamp + filename
-                file.save(os.path.join('static/uploads/hero', filename))
-                image_filename = filename
+        image_filename = save_upload(request.files.get('hero_image'), 'hero')
         
         existing_hero = conn.execute('SELECT * FROM hero_section').fetchone()
+        if existing_hero and image_filename and existing_hero['image_filename']:
+            delete_upload('hero', existing_hero['image_filename'])
         if existing_hero:
             conn.execute('UPDATE hero_section SET agency_name = ?, main_title = ?, description = ?, button_text = ?, image_filename = COALESCE(?, image_filename), updated_at = CURRENT_TIMESTAMP WHERE id = ?',
                        (agency_name, main_title, description, button_text, image_filename, existing_hero['id']))
@@ -243,16 +2045,15 @@ def admin_hero():
                        (agency_name, main_title, description, button_text, image_filename))
         
         conn.commit()
-        conn.close()
         flash('Hero section updated successfully!', 'success')
         return redirect(url_for('admin_hero'))
     
     hero = conn.execute('SELECT * FROM hero_section').fetchone()
-    conn.close()
     return render_template('admin/hero.html', hero=hero)
 
 @app.route('/admin/about', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def admin_about():
     conn = get_db_connection()
     if request.method == 'POST':
@@ -264,18 +2065,11 @@ def admin_about():
         feature2_title = request.form['feature2_title']
         feature2_description = request.form['feature2_description']
         
-        image_filename = None
-        if 'about_image' in request.files:
-            file = request.files['about_image']
-            if file and file.filename != '' and allowed_file(file.filename):
-                os.makedirs('static/uploads/about', exist_ok=True)
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                filename = timestamp + filename
-                file.save(os.path.join('static/uploads/about', filename))
-                image_filename = filename
+        image_filename = save_upload(request.files.get('about_image'), 'about')
         
         existing_about = conn.execute('SELECT * FROM about_section').fetchone()
+        if existing_about and image_filename and existing_about['image_filename']:
+            delete_upload('about', existing_about['image_filename'])
         if existing_about:
             conn.execute('UPDATE about_section SET main_title = ?, lead_text = ?, description = ?, image_filename = COALESCE(?, image_filename), feature1_title = ?, feature1_description = ?, feature2_title = ?, feature2_description = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
                        (main_title, lead_text, description, image_filename, feature1_title, feature1_description, feature2_title, feature2_description, existing_about['id']))
@@ -284,16 +2078,15 @@ def admin_about():
                        (main_title, lead_text, description, image_filename, feature1_title, feature1_description, feature2_title, feature2_description))
         
         conn.commit()
-        conn.close()
         flash('About section updated successfully!', 'success')
         return redirect(url_for('admin_about'))
     
     about = conn.execute('SELECT * FROM about_section').fetchone()
-    conn.close()
     return render_template('admin/about.html', about=about)
 
 @app.route('/admin/footer', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def admin_footer():
     conn = get_db_connection()
     if request.method == 'POST':
@@ -313,12 +2106,10 @@ def admin_footer():
                        (description, instagram_url, telegram_url, youtube_url, tiktok_url, contact_email))
         
         conn.commit()
-        conn.close()
         flash('Footer section updated successfully!', 'success')
         return redirect(url_for('admin_footer'))
     
     footer = conn.execute('SELECT * FROM footer_section').fetchone()
-    conn.close()
     return render_template('admin/footer.html', footer=footer)
 
 @app.route('/admin/schools')
@@ -326,33 +2117,23 @@ def admin_footer():
 def admin_schools():
     conn = get_db_connection()
     schools = conn.execute('SELECT * FROM schools ORDER BY created_at DESC').fetchall()
-    conn.close()
     return render_template('admin/schools.html', schools=schools)
 
 @app.route('/admin/schools/new', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def new_school():
     if request.method == 'POST':
         name = request.form['name']
         description = request.form['description']
         website_link = request.form['website_link']
         
-        logo_filename = None
-        if 'logo' in request.files:
-            file = request.files['logo']
-            if file and file.filename != '' and allowed_file(file.filename):
-                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                filename = timestamp + filename
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                logo_filename = filename
+        logo_filename = save_upload(request.files.get('logo'), 'schools')
         
         conn = get_db_connection()
         conn.execute('INSERT INTO schools (name, description, logo_filename, website_link) VALUES (?, ?, ?, ?)', 
                     (name, description, logo_filename, website_link))
         conn.commit()
-        conn.close()
         flash('School added successfully!', 'success')
         return redirect(url_for('admin_schools'))
     
@@ -360,6 +2141,7 @@ def new_school():
 
 @app.route('/admin/schools/edit/<int:school_id>', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def edit_school(school_id):
     conn = get_db_connection()
     if request.method == 'POST':
@@ -369,40 +2151,26 @@ def edit_school(school_id):
         is_active = 'is_active' in request.form
         remove_logo = 'remove_logo' in request.form
         
+        new_logo_filename = save_upload(request.files.get('logo'), 'schools')
         current_school = conn.execute('SELECT logo_filename FROM schools WHERE id = ?', (school_id,)).fetchone()
         logo_filename = current_school['logo_filename']
         
         if remove_logo and logo_filename:
-            try:
-                os.remove(os.path.join(app.config['UPLOAD_FOLDER'], logo_filename))
-            except:
-                pass
+            delete_upload('schools', logo_filename)
             logo_filename = None
         
-        if 'logo' in request.files:
-            file = request.files['logo']
-            if file and file.filename != '' and allowed_file(file.filename):
-                os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-                if logo_filename:
-                    try:
-                        os.remove(os.path.join(app.config['UPLOAD_FOLDER'], logo_filename))
-                    except:
-                        pass
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                filename = timestamp + filename
-                file.save(os.path.join(app.config['UPLOAD_FOLDER'], filename))
-                logo_filename = filename
+        if new_logo_filename:
+            if logo_filename:
+                delete_upload('schools', logo_filename)
+            logo_filename = new_logo_filename
         
         conn.execute('UPDATE schools SET name = ?, description = ?, logo_filename = ?, website_link = ?, is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
                     (name, description, logo_filename, website_link, is_active, school_id))
         conn.commit()
-        conn.close()
         flash('School updated successfully!', 'success')
         return redirect(url_for('admin_schools'))
     
     school = conn.execute('SELECT * FROM schools WHERE id = ?', (school_id,)).fetchone()
-    conn.close()
     if not school:
         flash('School not found!', 'error')
         return redirect(url_for('admin_schools'))
@@ -410,22 +2178,60 @@ def edit_school(school_id):
 
 @app.route('/admin/schools/delete/<int:school_id>')
 @admin_required
+@invalidates_content
 def delete_school(school_id):
     conn = get_db_connection()
     school = conn.execute('SELECT logo_filename FROM schools WHERE id = ?', (school_id,)).fetchone()
     if school and school['logo_filename']:
-        try:
-            os.remove(os.path.join(app.config['UPLOAD_FOLDER'], school['logo_filename']))
-        except:
-            pass
+        delete_upload('schools', school['logo_filename'])
     conn.execute('DELETE FROM schools WHERE id = ?', (school_id,))
     conn.commit()
-    conn.close()
     flash('School deleted successfully!', 'success')
     return redirect(url_for('admin_schools'))
 
+# Bulk actions on public content. 'uploads' selects the upload filenames owned
+# by the targeted rows, so deleting them releases those files in one sweep.
+BULK_CONTENT = {
+    'schools': {'table': 'schools', 'label': 'school(s)', 'redirect': 'admin_schools', 'folder': 'schools',
+                'uploads': 'SELECT logo_filename FROM schools WHERE {where} AND logo_filename IS NOT NULL'},
+    'team': {'table': 'team_members', 'label': 'team member(s)', 'redirect': 'admin_team', 'folder': 'team',
+             'uploads': 'SELECT image_filename FROM team_members WHERE {where} AND image_filename IS NOT NULL'},
+    'events': {'table': 'events', 'label': 'event(s)', 'redirect': 'admin_events', 'folder': 'events',
+               'uploads': 'SELECT filename FROM event_images WHERE event_id IN (SELECT id FROM events WHERE {where})'},
+}
+
+@app.route('/admin/<any(schools, team, events):kind>/bulk', methods=['POST'])
+@admin_required
+@invalidates_content
+def bulk_content(kind):
+    target = BULK_CONTENT[kind]
+    action = request.form.get('action')
+    if kind == 'events' and request.form.get('scope') == 'past':
+        where, params = "event_date < date('now')", []
+    else:
+        where, params = bulk_selected_ids()
+
+    conn = get_db_connection()
+    if action == 'delete':
+        filenames = [row[0] for row in conn.execute(target['uploads'].format(where=where), params)]
+        delete_uploads(conn, [(target['folder'], filename) for filename in filenames])
+        count = conn.execute(f"DELETE FROM {target['table']} WHERE {where}", params).rowcount
+        verb = 'deleted'
+    elif action in ('activate', 'deactivate'):
+        is_active = int(action == 'activate')
+        count = conn.execute(f"UPDATE {target['table']} SET is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE {where} AND is_active != ?",
+                             [is_active] + params + [is_active]).rowcount
+        verb = action + 'd'
+    else:
+        flash('Unknown bulk action.', 'error')
+        return redirect(url_for(target['redirect']))
+    conn.commit()
+    flash(f"{count} {target['label']} {verb}.", 'success')
+    return redirect(url_for(target['redirect']))
+
 @app.route('/admin/schools/toggle-status/<int:school_id>', methods=['POST'])
 @admin_required
+@invalidates_content
 def toggle_school_status(school_id):
     conn = get_db_connection()
     school = conn.execute('SELECT name, is_active FROM schools WHERE id = ?', (school_id,)).fetchone()
@@ -436,7 +2242,6 @@ def toggle_school_status(school_id):
     new_status = not school['is_active']
     conn.execute('UPDATE schools SET is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?', (new_status, school_id))
     conn.commit()
-    conn.close()
     status_text = "activated" if new_status else "deactivated"
     flash(f"School '{school['name']}' has been {status_text}!", 'success')
     return redirect(url_for('admin_schools'))
@@ -446,11 +2251,11 @@ def toggle_school_status(school_id):
 def admin_team():
     conn = get_db_connection()
     team_members = conn.execute('SELECT * FROM team_members ORDER BY display_order ASC, created_at DESC').fetchall()
-    conn.close()
     return render_template('admin/team.html', team_members=team_members)
 
 @app.route('/admin/team/new', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def new_team_member():
     if request.method == 'POST':
         name = request.form['name']
@@ -465,22 +2270,12 @@ def new_team_member():
             'instagram': request.form.get('instagram', '')
         }
         
-        image_filename = None
-        if 'image' in request.files:
-            file = request.files['image']
-            if file and file.filename != '' and allowed_file(file.filename):
-                os.makedirs('static/uploads/team', exist_ok=True)
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                filename = timestamp + filename
-                file.save(os.path.join('static/uploads/team', filename))
-                image_filename = filename
+        image_filename = save_upload(request.files.get('image'), 'team')
         
         conn = get_db_connection()
         conn.execute('INSERT INTO team_members (name, position, description, image_filename, social_links, display_order) VALUES (?, ?, ?, ?, ?, ?)',
                     (name, position, description, image_filename, json.dumps(social_links), display_order))
         conn.commit()
-        conn.close()
         flash('Team member added successfully!', 'success')
         return redirect(url_for('admin_team'))
     
@@ -488,6 +2283,7 @@ def new_team_member():
 
 @app.route('/admin/team/edit/<int:member_id>', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def edit_team_member(member_id):
     conn = get_db_connection()
     if request.method == 'POST':
@@ -505,40 +2301,26 @@ def edit_team_member(member_id):
             'instagram': request.form.get('instagram', '')
         }
         
+        new_image_filename = save_upload(request.files.get('image'), 'team')
         current_member = conn.execute('SELECT image_filename FROM team_members WHERE id = ?', (member_id,)).fetchone()
         image_filename = current_member['image_filename']
         
         if remove_image and image_filename:
-            try:
-                os.remove(os.path.join('static/uploads/team', image_filename))
-            except:
-                pass
+            delete_upload('team', image_filename)
             image_filename = None
         
-        if 'image' in request.files:
-            file = request.files['image']
-            if file and file.filename != '' and allowed_file(file.filename):
-                os.makedirs('static/uploads/team', exist_ok=True)
-                if image_filename:
-                    try:
-                        os.remove(os.path.join('static/uploads/team', image_filename))
-                    except:
-                        pass
-                filename = secure_filename(file.filename)
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                filename = timestamp + filename
-                file.save(os.path.join('static/uploads/team', filename))
-                image_filename = filename
+        if new_image_filename:
+            if image_filename:
+                delete_upload('team', image_filename)
+            image_filename = new_image_filename
         
         conn.execute('UPDATE team_members SET name = ?, position = ?, description = ?, image_filename = ?, social_links = ?, display_order = ?, is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
                     (name, position, description, image_filename, json.dumps(social_links), display_order, is_active, member_id))
         conn.commit()
-        conn.close()
         flash('Team member updated successfully!', 'success')
         return redirect(url_for('admin_team'))
     
     member = conn.execute('SELECT * FROM team_members WHERE id = ?', (member_id,)).fetchone()
-    conn.close()
     if not member:
         flash('Team member not found!', 'error')
         return redirect(url_for('admin_team'))
@@ -547,7 +2329,7 @@ def edit_team_member(member_id):
     if member_dict['social_links']:
         try:
             member_dict['social_links_dict'] = json.loads(member_dict['social_links'])
-        except:
+        except ValueError:
             member_dict['social_links_dict'] = {}
     else:
         member_dict['social_links_dict'] = {}
@@ -556,22 +2338,20 @@ def edit_team_member(member_id):
 
 @app.route('/admin/team/delete/<int:member_id>')
 @admin_required
+@invalidates_content
 def delete_team_member(member_id):
     conn = get_db_connection()
     member = conn.execute('SELECT image_filename FROM team_members WHERE id = ?', (member_id,)).fetchone()
     if member and member['image_filename']:
-        try:
-            os.remove(os.path.join('static/uploads/team', member['image_filename']))
-        except:
-            pass
+        delete_upload('team', member['image_filename'])
     conn.execute('DELETE FROM team_members WHERE id = ?', (member_id,))
     conn.commit()
-    conn.close()
     flash('Team member deleted successfully!', 'success')
     return redirect(url_for('admin_team'))
 
 @app.route('/admin/team/toggle-status/<int:member_id>', methods=['POST'])
 @admin_required
+@invalidates_content
 def toggle_team_member_status(member_id):
     conn = get_db_connection()
     member = conn.execute('SELECT name, is_active FROM team_members WHERE id = ?', (member_id,)).fetchone()
@@ -582,7 +2362,6 @@ def toggle_team_member_status(member_id):
     new_status = not member['is_active']
     conn.execute('UPDATE team_members SET is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?', (new_status, member_id))
     conn.commit()
-    conn.close()
     status_text = "activated" if new_status else "deactivated"
     flash(f"Team member '{member['name']}' has been {status_text}!", 'success')
     return redirect(url_for('admin_team'))
@@ -591,27 +2370,12 @@ def toggle_team_member_status(member_id):
 @admin_required
 def admin_events():
     conn = get_db_connection()
-    events = conn.execute('SELECT * FROM events ORDER BY event_date DESC').fetchall()
-    conn.close()
-    
-    processed_events = []
-    for event in events:
-        event_dict = dict(event)
-        if event_dict['image_filenames'] and event_dict['image_filenames'] != '[]':
-            try:
-                filenames_str = event_dict['image_filenames'].strip('[]').replace("'", "").replace('"', '')
-                image_filenames = [f.strip() for f in filenames_str.split(',') if f.strip()]
-                event_dict['image_count'] = len(image_filenames)
-            except:
-                event_dict['image_count'] = 0
-        else:
-            event_dict['image_count'] = 0
-        processed_events.append(event_dict)
-    
-    return render_template('admin/events.html', events=processed_events)
+    events = conn.execute('SELECT e.*, (SELECT COUNT(*) FROM event_images i WHERE i.event_id = e.id) AS image_count FROM events e ORDER BY e.event_date DESC').fetchall()
+    return render_template('admin/events.html', events=events)
 
 @app.route('/admin/events/new', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def new_event():
     if request.method == 'POST':
         title = request.form['title']
@@ -620,23 +2384,13 @@ def new_event():
         event_type = request.form['event_type']
         registration_link = request.form['registration_link']
         
-        image_filenames = []
-        if 'event_images' in request.files:
-            files = request.files.getlist('event_images')
-            for file in files:
-                if file and file.filename != '' and allowed_file(file.filename):
-                    os.makedirs(app.config['UPLOAD_FOLDER_EVENTS'], exist_ok=True)
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                    filename = timestamp + filename
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER_EVENTS'], filename))
-                    image_filenames.append(filename)
+        image_filenames = save_uploads(request.files.getlist('event_images'), 'events')
         
         conn = get_db_connection()
-        conn.execute('INSERT INTO events (title, description, event_date, event_type, registration_link, image_filenames) VALUES (?, ?, ?, ?, ?, ?)',
-                    (title, description, event_date, event_type, registration_link, str(image_filenames)))
+        cursor = conn.execute('INSERT INTO events (title, description, event_date, event_type, registration_link) VALUES (?, ?, ?, ?, ?)',
+                              (title, description, event_date, event_type, registration_link))
+        add_event_images(conn, cursor.lastrowid, image_filenames)
         conn.commit()
-        conn.close()
         flash('Event added successfully!', 'success')
         return redirect(url_for('admin_events'))
     
@@ -644,6 +2398,7 @@ def new_event():
 
 @app.route('/admin/events/edit/<int:event_id>', methods=['GET', 'POST'])
 @admin_required
+@invalidates_content
 def edit_event(event_id):
     conn = get_db_connection()
     if request.method == 'POST':
@@ -655,80 +2410,48 @@ def edit_event(event_id):
         is_active = 'is_active' in request.form
         remove_images = request.form.getlist('remove_images')
         
-        current_event = conn.execute('SELECT image_filenames FROM events WHERE id = ?', (event_id,)).fetchone()
-        current_images = []
-        if current_event['image_filenames'] and current_event['image_filenames'] != '[]':
-            try:
-                filenames_str = current_event['image_filenames'].strip('[]').replace("'", "").replace('"', '')
-                current_images = [f.strip() for f in filenames_str.split(',') if f.strip()]
-            except:
-                current_images = []
-        
-        if remove_images:
-            for filename in remove_images:
-                if filename in current_images:
-                    try:
-                        os.remove(os.path.join(app.config['UPLOAD_FOLDER_EVENTS'], filename))
-                    except:
-                        pass
-                    current_images.remove(filename)
-        
-        if 'event_images' in request.files:
-            files = request.files.getlist('event_images')
-            for file in files:
-                if file and file.filename != '' and allowed_file(file.filename):
-                    os.makedirs(app.config['UPLOAD_FOLDER_EVENTS'], exist_ok=True)
-                    filename = secure_filename(file.filename)
-                    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S_")
-                    filename = timestamp + filename
-                    file.save(os.path.join(app.config['UPLOAD_FOLDER_EVENTS'], filename))
-                    current_images.append(filename)
-        
-        conn.execute('UPDATE events SET title = ?, description = ?, event_date = ?, event_type = ?, registration_link = ?, image_filenames = ?, is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
-                    (title, description, event_date, event_type, registration_link, str(current_images), is_active, event_id))
+        new_images = save_uploads(request.files.getlist('event_images'), 'events')
+        current_images = get_event_images(conn, event_id)
+        
+        removed_images = [filename for filename in set(remove_images) if filename in current_images]
+        # Identical images share one file, so an event can list it more than
+        # once; every row deleted below gives back its own reference.
+        delete_uploads(conn, [('events', filename) for filename in current_images if filename in removed_images])
+        conn.executemany('DELETE FROM event_images WHERE event_id = ? AND filename = ?',
+                         [(event_id, filename) for filename in removed_images])
+        add_event_images(conn, event_id, new_images)
+        
+        conn.execute('UPDATE events SET title = ?, description = ?, event_date = ?, event_type = ?, registration_link = ?, is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?',
+                    (title, description, event_date, event_type, registration_link, is_active, event_id))
         conn.commit()
-        conn.close()
         flash('Event updated successfully!', 'success')
         return redirect(url_for('admin_events'))
     
     event = conn.execute('SELECT * FROM events WHERE id = ?', (event_id,)).fetchone()
-    conn.close()
     if not event:
         flash('Event not found!', 'error')
         return redirect(url_for('admin_events'))
     
     event_dict = dict(event)
-    if event_dict['image_filenames'] and event_dict['image_filenames'] != '[]':
-        try:
-            filenames_str = event_dict['image_filenames'].strip('[]').replace("'", "").replace('"', '')
-            event_dict['processed_images'] = [f.strip() for f in filenames_str.split(',') if f.strip()]
-        except:
-            event_dict['processed_images'] = []
-    else:
-        event_dict['processed_images'] = []
+    event_dict['processed_images'] = get_event_images(conn, event_id)
     
     return render_template('admin/edit_event.html', event=event_dict)
 
 @app.route('/admin/events/delete/<int:event_id>')
 @admin_required
+@invalidates_content
 def delete_event(event_id):
     conn = get_db_connection()
-    event = conn.execute('SELECT image_filenames FROM events WHERE id = ?', (event_id,)).fetchone()
-    if event and event['image_filenames']:
-        image_filenames = eval(event['image_filenames'])
-        for filename in image_filenames:
-            try:
-                os.remove(os.path.join(app.config['UPLOAD_FOLDER_EVENTS'], filename))
-            except:
-                pass
+    for filename in get_event_images(conn, event_id):
+        delete_upload('events', filename)
     conn.execute('DELETE FROM events WHERE id = ?', (event_id,))
     conn.commit()
-    conn.close()
     flash('Event deleted successfully!', 'success')
     return redirect(url_for('admin_events'))
 
 @app.route('/admin/events/toggle-status/<int:event_id>', methods=['POST'])
 @admin_required
+@invalidates_content
 def toggle_event_status(event_id):
     conn = get_db_connection()
     event = conn.execute('SELECT title, is_active FROM events WHERE id = ?', (event_id,)).fetchone()
@@ -739,22 +2462,23 @@ def toggle_event_status(event_id):
     new_status = not event['is_active']
     conn.execute('UPDATE events SET is_active = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?', (new_status, event_id))
     conn.commit()
-    conn.close()
     status_text = "activated" if new_status else "deactivated"
     flash(f"Event '{event['title']}' has been {status_text}!", 'success')
     return redirect(url_for('admin_events'))
 
 @app.route('/contact', methods=['POST'])
+@rate_limited('contact')
 def contact_submit():
     if request.method == 'POST':
         name = request.form['name']
         email = request.form['email']
         message = request.form['message']
         
-        conn = get_db_connection()
-        conn.execute('INSERT INTO contact_messages (name, email, message) VALUES (?, ?, ?)', (name, email, message))
-        conn.commit()
-        conn.close()
+        try:
+            submit_contact_message(name, email, message)
+        except queue.Full:
+            flash('We are receiving a lot of messages right now. Please try again in a moment.', 'error')
+            return redirect(url_for('index') + '#contact')
         flash('Your message has been sent successfully! We will get back to you soon.', 'success')
         return redirect(url_for('index') + '#contact')
     
@@ -763,17 +2487,113 @@ def contact_submit():
 @app.route('/admin/messages')
 @admin_required
 def admin_messages():
+    status = request.args.get('status', 'all')
+    date_from = request.args.get('from', '')
+    date_to = request.args.get('to', '')
+    after = request.args.get('after', '')
+    before = request.args.get('before', '')
+    per_page = app.config['MESSAGES_PER_PAGE']
+
+    conditions = []
+    params = []
+    if status == 'unread':
+        conditions.append('is_read = 0')
+    elif status == 'read':
+        conditions.append('is_read = 1')
+    else:
+        status = 'all'
+    start_date = parse_date(date_from)
+    if start_date:
+        conditions.append('created_at >= ?')
+        params.append(start_date.strftime('%Y-%m-%d'))
+    else:
+        date_from = ''
+    end_date = parse_date(date_to)
+    if end_date:
+        conditions.append('created_at < ?')
+        params.append((end_date + timedelta(days=1)).strftime('%Y-%m-%d'))
+    else:
+        date_to = ''
+
+    # Pages are addressed by the (created_at, id) of the row next to them, so
+    # every page is an index range scan no matter how deep the inbox goes.
+    cursor = before or after
+    if '|' in cursor:
+        cursor_created_at, cursor_id = cursor.rsplit('|', 1)
+        if cursor_id.isdigit():
+            conditions.append('(created_at, id) > (?, ?)' if before else '(created_at, id) < (?, ?)')
+            params.extend([cursor_created_at, int(cursor_id)])
+        else:
+            cursor = ''
+    else:
+        cursor = ''
+    order = 'ASC' if before and cursor else 'DESC'
+    where = ('WHERE ' + ' AND '.join(conditions)) if conditions else ''
+
     conn = get_db_connection()
-    messages = conn.execute('SELECT * FROM contact_messages ORDER BY created_at DESC').fetchall()
-    total_messages = len(messages)
-    unread_messages = sum(1 for m in messages if not m['is_read'])
-    read_messages = total_messages - unread_messages
+    messages = conn.execute(f'SELECT id, name, email, substr(message, 1, 81) AS message, is_read, created_at FROM contact_messages {where} '
+                            f'ORDER BY created_at {order}, id {order} LIMIT ?', params + [per_page + 1]).fetchall()
+    has_more = len(messages) > per_page
+    messages = messages[:per_page]
+    if order == 'ASC':
+        messages.reverse()
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = bool(cursor), has_more
+
+    stats = get_stats(conn)
     today = datetime.now().strftime('%Y-%m-%d')
-    today_messages = sum(1 for m in messages if m['created_at'].startswith(today))
-    conn.close()
-    
-    return render_template('admin/messages.html', messages=messages, total_messages=total_messages,
-                         unread_messages=unread_messages, read_messages=read_messages, today_messages=today_messages)
+    today_messages = conn.execute('SELECT COUNT(*) FROM contact_messages WHERE created_at >= ?', (today,)).fetchone()[0]
+
+    filters = {'status': status, 'from': date_from, 'to': date_to}
+    link_filters = {key: value for key, value in filters.items() if value and value != 'all'}
+    newer_url = older_url = None
+    if messages and has_newer:
+        newer_url = url_for('admin_messages', before=f"{messages[0]['created_at']}|{messages[0]['id']}", **link_filters)
+    if messages and has_older:
+        older_url = url_for('admin_messages', after=f"{messages[-1]['created_at']}|{messages[-1]['id']}", **link_filters)
+
+    return render_template('admin/messages.html', messages=messages, total_messages=stats['messages_total'],
+                         unread_messages=stats['messages_unread'], read_messages=stats['messages_total'] - stats['messages_unread'],
+                         today_messages=today_messages, filters=filters, newer_url=newer_url, older_url=older_url)
+
+def bulk_selected_ids():
+    ids = [int(value) for value in request.form.getlist('ids') if value.isdigit()]
+    return 'id IN (SELECT value FROM json_each(?))', [json.dumps(ids)]
+
+@app.route('/admin/messages/bulk', methods=['POST'])
+@admin_required
+def bulk_messages():
+    action = request.form.get('action')
+    if request.form.get('scope') == 'filter':
+        # e.g. "read messages older than 90 days"
+        days = request.form.get('older_than_days', type=int)
+        if not days or days < 1:
+            flash('Choose how many days old the messages must be.', 'error')
+            return redirect(url_for('admin_messages'))
+        conditions = ["created_at < datetime('now', ?)"]
+        params = [f'-{days} days']
+        if request.form.get('status') in ('read', 'unread'):
+            conditions.append('is_read = ?')
+            params.append(int(request.form['status'] == 'read'))
+        where = ' AND '.join(conditions)
+    else:
+        where, params = bulk_selected_ids()
+
+    conn = get_db_connection()
+    if action == 'delete':
+        count = conn.execute(f'DELETE FROM contact_messages WHERE {where}', params).rowcount
+        verb = 'deleted'
+    elif action in ('mark_read', 'mark_unread'):
+        is_read = int(action == 'mark_read')
+        count = conn.execute(f'UPDATE contact_messages SET is_read = ? WHERE {where} AND is_read != ?', [is_read] + params + [is_read]).rowcount
+        verb = 'marked as read' if is_read else 'marked as unread'
+    else:
+        flash('Unknown bulk action.', 'error')
+        return redirect(url_for('admin_messages'))
+    conn.commit()
+    flash(f'{count} message(s) {verb}.', 'success')
+    return redirect(url_for('admin_messages'))
 
 @app.route('/admin/messages/view/<int:message_id>')
 @admin_required
@@ -783,7 +2603,6 @@ def view_message(message_id):
     if message and not message['is_read']:
         conn.execute('UPDATE contact_messages SET is_read = 1 WHERE id = ?', (message_id,))
         conn.commit()
-    conn.close()
     
     if message:
         return render_template('admin/view_message.html', message=message)
@@ -797,7 +2616,6 @@ def delete_message(message_id):
     conn = get_db_connection()
     conn.execute('DELETE FROM contact_messages WHERE id = ?', (message_id,))
     conn.commit()
-    conn.close()
     flash('Message deleted successfully!', 'success')
     return redirect(url_for('admin_messages'))
 
@@ -807,7 +2625,6 @@ def mark_message_read(message_id):
     conn = get_db_connection()
     conn.execute('UPDATE contact_messages SET is_read = 1 WHERE id = ?', (message_id,))
     conn.commit()
-    conn.close()
     flash('Message marked as read!', 'success')
     return redirect(url_for('admin_messages'))
 
@@ -817,10 +2634,98 @@ def mark_message_unread(message_id):
     conn = get_db_connection()
     conn.execute('UPDATE contact_messages SET is_read = 0 WHERE id = ?', (message_id,))
     conn.commit()
-    conn.close()
     flash('Message marked as unread!', 'success')
     return redirect(url_for('admin_messages'))
 
+# Each searchable table has an external-content FTS5 index (migration 9) that
+# triggers keep in sync. Column 0 of every index is the one shown as the title.
+SEARCH_SOURCES = {
+    'messages': {'label': 'Messages', 'table': 'contact_messages', 'meta': 'created_at', 'endpoint': 'view_message', 'arg': 'message_id'},
+    'events': {'label': 'Events', 'table': 'events', 'meta': 'event_date', 'endpoint': 'edit_event', 'arg': 'event_id'},
+    'schools': {'label': 'Schools', 'table': 'schools', 'meta': 'website_link', 'endpoint': 'edit_school', 'arg': 'school_id'},
+    'team': {'label': 'Team', 'table': 'team_members', 'meta': 'position', 'endpoint': 'edit_team_member', 'arg': 'member_id'},
+}
+
+def search_query(text):
+    # Quoting every term keeps FTS5 operators in user input from being parsed.
+    return ' '.join(f'"{term}"*' for term in re.findall(r'\w+', text))
+
+def highlight_markup(text):
+    # highlight() and snippet() wrap matches in control characters that escape()
+    # leaves alone, so they can be turned into tags after the text is escaped.
+    return Markup(str(escape(text or '')).replace('\x02', '<mark class="bg-yellow-200 rounded px-0.5">').replace('\x03', '</mark>'))
+
+@app.route('/admin/search')
+@admin_required
+def admin_search():
+    q = request.args.get('q', '').strip()
+    kind = request.args.get('type', 'all')
+    if kind not in SEARCH_SOURCES:
+        kind = 'all'
+    page = max(request.args.get('page', 1, type=int), 1)
+    per_page = app.config['SEARCH_RESULTS_PER_PAGE'] if kind != 'all' else 5
+    offset = (page - 1) * per_page if kind != 'all' else 0
+
+    results = []
+    match = search_query(q)
+    if match:
+        conn = get_db_connection()
+        for name, source in SEARCH_SOURCES.items():
+            if kind not in ('all', name):
+                continue
+            fts = source['table'] + '_fts'
+            total = conn.execute(f'SELECT COUNT(*) FROM {fts} WHERE {fts} MATCH ?', (match,)).fetchone()[0]
+            rows = conn.execute(f'''SELECT f.rowid AS id, highlight({fts}, 0, char(2), char(3)) AS title,
+                                           snippet({fts}, -1, char(2), char(3), '…', 24) AS snippet, s.{source['meta']} AS meta
+                                    FROM {fts} f JOIN {source['table']} s ON s.id = f.rowid
+                                    WHERE {fts} MATCH ? ORDER BY bm25({fts}) LIMIT ? OFFSET ?''',
+                                (match, per_page, offset)).fetchall()
+            results.append({
+                'kind': name, 'label': source['label'], 'total': total,
+                'rows': [{'url': url_for(source['endpoint'], **{source['arg']: row['id']}), 'title': highlight_markup(row['title']),
+                          'snippet': highlight_markup(row['snippet']), 'meta': row['meta']} for row in rows],
+            })
+
+    prev_url = next_url = None
+    if kind != 'all' and results:
+        if page > 1:
+            prev_url = url_for('admin_search', q=q, type=kind, page=page - 1)
+        if offset + per_page < results[0]['total']:
+            next_url = url_for('admin_search', q=q, type=kind, page=page + 1)
+    return render_template('admin/search.html', q=q, kind=kind, sources=SEARCH_SOURCES, results=results,
+                           prev_url=prev_url, next_url=next_url)
+
+@app.route('/admin/jobs')
+@admin_required
+def admin_jobs():
+    conn = get_db_connection()
+    counts = {row['status']: row['count'] for row in conn.execute(
+        "SELECT status, COUNT(*) AS count FROM jobs WHERE status IN ('queued', 'running') GROUP BY status")}
+    failures = conn.execute("SELECT id, kind, error, updated_at FROM jobs WHERE status = 'failed' ORDER BY id DESC LIMIT 5").fetchall()
+    return jsonify(queued=counts.get('queued', 0), running=counts.get('running', 0),
+                   recent_failures=[dict(job) for job in failures])
+
+@app.route('/admin/jobs/<int:job_id>')
+@admin_required
+def admin_job_status(job_id):
+    job = get_db_connection().execute('SELECT id, kind, status, attempts, error, created_at, updated_at FROM jobs WHERE id = ?',
+                                      (job_id,)).fetchone()
+    if not job:
+        abort(404)
+    return jsonify(dict(job))
+
+@app.route('/admin/metrics')
+def admin_metrics():
+    # Scrapers authenticate with METRICS_TOKEN as a bearer token; admins can just open the page.
+    token = app.config['METRICS_TOKEN']
+    authorized = token and hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not authorized and 'admin_logged_in' not in session:
+        abort(401)
+    response = make_response(render_metrics())
+    response.headers['Content-Type'] = 'text/plain; version=0.0.4; charset=utf-8'
+    response.cache_control.no_store = True
+    return response
+
 @app.route('/admin/logout')
 def admin_logout():
     username = session.get('admin_username', 'Unknown')
@@ -828,12 +2733,532 @@ def admin_logout():
     flash(f'User {username} logged out successfully!', 'success')
     return redirect(url_for('admin_login'))
 
+def compile_templates():
+    templates = app.jinja_env.list_templates(extensions=['html'])
+    for name in templates:
+        app.jinja_env.get_template(name)
+    return templates
+
+def warm_up():
+    """Compile every template and render the landing page into the page cache.
+
+    Run in the gunicorn master (see gunicorn.conf.py) so forked workers start
+    with the templates, the content snapshot and the cached home page already
+    in memory.
+    """
+    compile_templates()
+    with app.test_request_context('/'):
+        index()
+    # Workers open their own connections; drop the master's.
+    close_db_connections()
+
+@app.cli.command('init-db')
+def init_db_command():
+    """Create or upgrade the database, upload folders and template cache."""
+    applied = init_db()
+    click.echo(f"Database {app.config['DATABASE']} at schema version {MIGRATIONS[-1][0]}"
+               + (f" (applied {', '.join(map(str, applied))})." if applied else '.'))
+    templates = compile_templates()
+    click.echo(f"Compiled {len(templates)} templates into {app.config['TEMPLATE_CACHE_FOLDER']}.")
+
+@app.cli.command('export-site')
+@click.option('--output', default=None, help='Export folder (default: EXPORT_FOLDER, or ./export).')
+def export_site_command(output):
+    """Pre-render the public pages to static HTML for nginx or a CDN."""
+    folder = output or app.config['EXPORT_FOLDER'] or 'export'
+    release = export_site(folder)
+    size = sum(entry.stat().st_size for entry in os.scandir(release) if entry.is_file(follow_symlinks=False))
+    click.echo(f"Exported {len(EXPORT_PAGES)} page(s) to {os.path.join(folder, 'current')} ({size / 1024:.0f} KB with compressed copies).")
+
+@app.cli.command('migrate')
+def migrate_command():
+    """Apply pending schema migrations."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    applied = run_migrations(conn)
+    for version, description, _ in MIGRATIONS:
+        status = 'applied now' if version in applied else 'ok'
+        click.echo(f'{version:3d}  {description}  [{status}]')
+    conn.close()
+
+@app.cli.command('check-stats')
+@click.option('--fix', is_flag=True, help='Overwrite drifted counters with the recomputed values.')
+def check_stats_command(fix):
+    """Recompute the dashboard counters from scratch and report drift."""
+    conn = sqlite3.connect(app.config['DATABASE'])
+    stored = get_stats(conn)
+    drifted = 0
+    for name, actual in compute_stats(conn).items():
+        value = stored.get(name)
+        if value == actual:
+            click.echo(f'{name:20s} {actual:10d}  ok')
+            continue
+        drifted += 1
+        click.echo(f'{name:20s} {actual:10d}  stored {value} (drift {actual - (value or 0):+d})')
+        if fix:
+            conn.execute('INSERT OR REPLACE INTO stats (name, value) VALUES (?, ?)', (name, actual))
+    conn.commit()
+    conn.close()
+    if drifted and not fix:
+        raise click.ClickException(f'{drifted} counter(s) drifted; rerun with --fix to repair')
+
+@app.cli.command('run-jobs')
+@click.option('--burst', is_flag=True, help='Exit once the queue is empty instead of waiting for more jobs.')
+def run_jobs_command(burst):
+    """Drain the background job queue in the foreground."""
+    try:
+        work_jobs(burst=burst)
+    except KeyboardInterrupt:
+        pass
+
+@app.cli.command('build-assets')
+def build_assets_command():
+    """Fingerprint and precompress the static files templates load through asset_url()."""
+    paths = set()
+    template_folder = os.path.join(app.root_path, app.template_folder)
+    for root, _, files in os.walk(template_folder):
+        for name in files:
+            if name.endswith('.html'):
+                with open(os.path.join(root, name), encoding='utf-8') as f:
+                    paths.update(ASSET_TEMPLATE_PATTERN.findall(f.read()))
+    built = {}
+    for path in sorted(paths):
+        if not os.path.isfile(os.path.join(app.static_folder, path)):
+            click.echo(f'missing  {path}', err=True)
+            continue
+        fingerprint_asset(path, built)
+    write_file_atomic(os.path.join(app.config['ASSET_DIST_FOLDER'], 'manifest.json'),
+                      json.dumps(built, indent=2, sort_keys=True).encode('utf-8'))
+    source_bytes = sum(os.path.getsize(os.path.join(app.static_folder, path)) for path in built)
+    gzip_bytes = 0
+    for hashed in built.values():
+        target = os.path.join(app.config['ASSET_DIST_FOLDER'], hashed)
+        gzip_bytes += os.path.getsize(target + '.gz' if os.path.exists(target + '.gz') else target)
+    click.echo(f'Built {len(built)} assets: {source_bytes / 1024:.0f} KB source, {gzip_bytes / 1024:.0f} KB gzipped'
+               + ('' if brotli else ' (install brotli for .br files)') + '.')
+
+# Every column that stores an upload filename, with the folder it lives in.
+UPLOAD_REFERENCES = [
+    ('hero', 'hero_section', 'image_filename'),
+    ('about', 'about_section', 'image_filename'),
+    ('schools', 'schools', 'logo_filename'),
+    ('team', 'team_members', 'image_filename'),
+    ('events', 'event_images', 'filename'),
+]
+
+def referenced_uploads(conn):
+    """Return {folder: names} covering every upload a content row points at.
+
+    Each filename also adds a derived/<stem> entry for its resized variants.
+    """
+    referenced = {folder: set() for folder in app.config['UPLOAD_FOLDERS']}
+    for folder, table, column in UPLOAD_REFERENCES:
+        for (filename,) in conn.execute(f'SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL'):
+            referenced[folder].update((filename, 'derived/' + os.path.splitext(filename)[0]))
+    return referenced
+
+def upload_is_referenced(referenced, folder, name):
+    if folder is None:
+        return False
+    if name.startswith('derived/'):
+        # derived/<stem>-<width>.webp belongs to <stem>.<ext>
+        return name.rsplit('-', 1)[0] in referenced[folder]
+    return name in referenced[folder]
+
+def find_orphaned_uploads(conn, grace_hours):
+    """Return (folder, name, path, size) for upload files no row references, skipping files newer than grace_hours.
+
+    Staged uploads are checked like published ones; temp files left by
+    interrupted uploads are included with folder None.
+    """
+    referenced = referenced_uploads(conn)
+    cutoff = time.time() - grace_hours * 3600
+    directories = [(folder, directory, '') for folder, directory in app.config['UPLOAD_FOLDERS'].items()]
+    directories += [(folder, os.path.join(directory, 'derived'), 'derived/') for folder, directory in app.config['UPLOAD_FOLDERS'].items()]
+    directories += [(folder, os.path.join(app.config['UPLOAD_STAGING_FOLDER'], folder), '') for folder in app.config['UPLOAD_FOLDERS']]
+    directories.append((None, app.config['UPLOAD_TEMP_FOLDER'], ''))
+    orphans = []
+    for folder, directory, prefix in directories:
+        try:
+            entries = os.scandir(directory)
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.name.startswith('.') or not entry.is_file(follow_symlinks=False):
+                    continue
+                stat = entry.stat(follow_symlinks=False)
+                if stat.st_mtime > cutoff or upload_is_referenced(referenced, folder, prefix + entry.name):
+                    continue
+                orphans.append((folder, prefix + entry.name, entry.path, stat.st_size))
+    return orphans
+
+def collect_upload_garbage(conn, grace_hours, dry_run=False):
+    """Delete (or with dry_run only list) orphaned uploads and return the ones removed."""
+    orphans = find_orphaned_uploads(conn, grace_hours)
+    if dry_run or not orphans:
+        return orphans
+    # References are re-read under the write lock: save_upload() takes it before
+    # reusing an existing file, so nothing can start pointing at a file between
+    # this check and its removal.
+    removed = []
+    conn.execute('BEGIN IMMEDIATE')
+    try:
+        referenced = referenced_uploads(conn)
+        for folder, name, path, size in orphans:
+            if upload_is_referenced(referenced, folder, name):
+                continue
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                continue
+            if folder is not None and '/' not in name:
+                conn.execute('DELETE FROM media WHERE folder = ? AND filename = ?', (folder, name))
+            removed.append((folder, name, path, size))
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    return removed
+
+@job_handler('gc_uploads')
+def gc_uploads_job(conn, grace_hours=None):
+    removed = collect_upload_garbage(conn, app.config['UPLOAD_GC_GRACE_HOURS'] if grace_hours is None else grace_hours)
+    if removed:
+        app.logger.info('Removed %d orphaned upload(s), %.1f MB', len(removed), sum(size for *_, size in removed) / 1024 / 1024)
+
+@app.cli.command('gc-uploads')
+@click.option('--dry-run', is_flag=True, help='Only list the files that would be deleted.')
+@click.option('--grace-hours', type=float, default=None, help='Skip files modified more recently than this (default: UPLOAD_GC_GRACE_HOURS).')
+def gc_uploads_command(dry_run, grace_hours):
+    """Delete upload files that no hero, about, school, team or event row references."""
+    grace_hours = app.config['UPLOAD_GC_GRACE_HOURS'] if grace_hours is None else grace_hours
+    orphans = collect_upload_garbage(get_db_connection(), grace_hours, dry_run)
+    for folder, name, path, size in orphans:
+        click.echo(f'{size:>12,d}  {path}')
+    total = sum(size for *_, size in orphans)
+    verb = 'Would reclaim' if dry_run else 'Reclaimed'
+    click.echo(f'{verb} {total / 1024 / 1024:.1f} MB in {len(orphans)} file(s).')
+
+# Backups are snapshot directories under BACKUP_FOLDER, named by UTC time:
+#
+#   site.db        consistent copy of the database from the online backup API
+#   uploads/       the upload folders; files unchanged since the previous
+#                  snapshot are hardlinks to it, so a snapshot costs only what changed
+#   manifest.json  checksums of both, checked before anything is restored
+#
+# The database is copied BACKUP_PAGES_PER_STEP pages at a time with a short sleep
+# between steps, so request threads keep the disk and the GIL. The copy reads
+# inside one open read transaction: under WAL the app keeps writing meanwhile,
+# and those writes don't force the backup to restart from the first page.
+BACKUP_NAME_PATTERN = re.compile(r'\d{8}-\d{6}-\d{6}')
+
+def list_backups(folder):
+    """Return the paths of the complete snapshots in folder, oldest first."""
+    if not folder or not os.path.isdir(folder):
+        return []
+    return sorted(entry.path for entry in os.scandir(folder)
+                  if entry.is_dir() and BACKUP_NAME_PATTERN.fullmatch(entry.name))
+
+def load_backup_manifest(path):
+    with open(os.path.join(path, 'manifest.json')) as f:
+        return json.load(f)
+
+def backup_database(path):
+    source = sqlite3.connect(app.config['DATABASE'], timeout=app.config['SQLITE_BUSY_TIMEOUT'])
+    target = sqlite3.connect(path)
+    try:
+        source.execute('BEGIN')
+        source.execute('SELECT 1 FROM sqlite_master LIMIT 1')
+        pause = app.config['BACKUP_STEP_SLEEP']
+        source.backup(target, pages=app.config['BACKUP_PAGES_PER_STEP'], progress=lambda status, remaining, total: time.sleep(pause))
+        source.rollback()
+        # A snapshot is a single self-contained file.
+        target.execute('PRAGMA journal_mode = DELETE')
+        check = target.execute('PRAGMA quick_check').fetchone()[0]
+        user_version = target.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    if check != 'ok':
+        raise RuntimeError(f'Database copy failed quick_check: {check}')
+    return user_version
+
+def snapshot_uploads(target, previous=None):
+    """Copy the upload folders into target/uploads and return their manifest entries.
+
+    Files whose size and mtime match the previous snapshot's manifest are
+    hardlinked from it instead of copied and hashed again.
+    """
+    previous_files = load_backup_manifest(previous)['uploads'] if previous else {}
+    files = {}
+    for folder, root in app.config['UPLOAD_FOLDERS'].items():
+        for dirpath, dirnames, filenames in os.walk(root):
+            for filename in filenames:
+                if filename.endswith('.tmp'):
+                    continue
+                path = os.path.join(dirpath, filename)
+                name = posixpath.join(folder, os.path.relpath(path, root).replace(os.sep, '/'))
+                copy_path = os.path.join(target, 'uploads', *name.split('/'))
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                os.makedirs(os.path.dirname(copy_path), exist_ok=True)
+                entry = previous_files.get(name)
+                if entry and entry['size'] == stat.st_size and entry['mtime_ns'] == stat.st_mtime_ns:
+                    try:
+                        os.link(os.path.join(previous, 'uploads', *name.split('/')), copy_path)
+                        files[name] = entry
+                        continue
+                    except OSError:
+                        pass
+                try:
+                    shutil.copy2(path, copy_path)
+                except FileNotFoundError:
+                    continue
+                files[name] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns, 'sha256': file_sha256(copy_path)}
+    return files
+
+def create_backup(folder):
+    """Write a new snapshot of the database and uploads under folder, prune old ones and return its path."""
+    os.makedirs(folder, exist_ok=True)
+    backups = list_backups(folder)
+    path = os.path.join(folder, datetime.utcnow().strftime('%Y%m%d-%H%M%S-%f'))
+    # Written under a temporary name, so list_backups never sees a half-made snapshot.
+    partial = path + '.partial'
+    os.makedirs(partial)
+    try:
+        database = os.path.join(partial, 'site.db')
+        user_version = backup_database(database)
+        manifest = {
+            'created_at': datetime.utcnow().isoformat(timespec='seconds') + 'Z',
+            'database': {'size': os.path.getsize(database), 'sha256': file_sha256(database), 'user_version': user_version},
+            'uploads': snapshot_uploads(partial, backups[-1] if backups else None),
+        }
+        write_file_atomic(os.path.join(partial, 'manifest.json'), json.dumps(manifest, indent=1).encode())
+        os.rename(partial, path)
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    for old in list_backups(folder)[:-app.config['BACKUP_KEEP']]:
+        shutil.rmtree(old, ignore_errors=True)
+    return path
+
+def verify_backup(path):
+    """Check a snapshot against its manifest and return a list of problems, empty when it is sound."""
+    try:
+        manifest = load_backup_manifest(path)
+    except (OSError, ValueError) as e:
+        return [f'manifest.json: {e}']
+    problems = []
+    database = os.path.join(path, 'site.db')
+    if not os.path.isfile(database) or file_sha256(database) != manifest['database']['sha256']:
+        problems.append('site.db: missing or checksum mismatch')
+    else:
+        conn = sqlite3.connect(database)
+        try:
+            problems += [f'site.db: {row[0]}' for row in conn.execute('PRAGMA integrity_check') if row[0] != 'ok']
+            if conn.execute('PRAGMA user_version').fetchone()[0] > MIGRATIONS[-1][0]:
+                problems.append('site.db: schema is newer than this version of the app')
+        finally:
+            conn.close()
+    for name, entry in manifest['uploads'].items():
+        copy_path = os.path.join(path, 'uploads', *name.split('/'))
+        if not os.path.isfile(copy_path) or file_sha256(copy_path) != entry['sha256']:
+            problems.append(f'uploads/{name}: missing or checksum mismatch')
+    return problems
+
+def restore_backup(path, uploads=True):
+    """Copy a snapshot back over the live database (and upload files); return the number of files restored.
+
+    The snapshot should have passed verify_backup first. Live uploads the
+    snapshot doesn't know about are left for gc-uploads to collect.
+    """
+    manifest = load_backup_manifest(path)
+    source = sqlite3.connect(os.path.join(path, 'site.db'))
+    target = sqlite3.connect(app.config['DATABASE'], timeout=app.config['SQLITE_BUSY_TIMEOUT'])
+    try:
+        source.backup(target)
+        target.execute('PRAGMA journal_mode = WAL')
+        run_migrations(target)
+    finally:
+        target.close()
+        source.close()
+
+    restored = 0
+    if uploads:
+        for name, entry in manifest['uploads'].items():
+            folder, _, relative = name.partition('/')
+            if folder not in app.config['UPLOAD_FOLDERS']:
+                continue
+            live = os.path.join(app.config['UPLOAD_FOLDERS'][folder], *relative.split('/'))
+            if os.path.isfile(live) and os.path.getsize(live) == entry['size'] and file_sha256(live) == entry['sha256']:
+                continue
+            os.makedirs(os.path.dirname(live), exist_ok=True)
+            shutil.copy2(os.path.join(path, 'uploads', *name.split('/')), live + '.tmp')
+            os.replace(live + '.tmp', live)
+            restored += 1
+    bump_content_generation()
+    return restored
+
+@job_handler('backup_site')
+def backup_site_job(conn):
+    if app.config['BACKUP_FOLDER']:
+        create_backup(app.config['BACKUP_FOLDER'])
+
+def backup_folder(output=None):
+    return output or app.config['BACKUP_FOLDER'] or os.path.join(app.instance_path, 'backups')
+
+@app.cli.command('backup')
+@click.option('--output', default=None, help='Backup folder (default: BACKUP_FOLDER, or instance/backups).')
+@click.option('--list', 'list_only', is_flag=True, help='List the existing snapshots instead of taking one.')
+def backup_command(output, list_only):
+    """Snapshot the database and uploads while the site keeps running."""
+    folder = backup_folder(output)
+    if not list_only:
+        started = time.perf_counter()
+        path = create_backup(folder)
+        manifest = load_backup_manifest(path)
+        click.echo(f"Backed up {manifest['database']['size'] / 1024 / 1024:.1f} MB database and {len(manifest['uploads'])} "
+                   f'upload file(s) to {path} in {time.perf_counter() - started:.1f}s.')
+        return
+    for path in list_backups(folder):
+        manifest = load_backup_manifest(path)
+        click.echo(f"{os.path.basename(path)}  {manifest['created_at']}  schema {manifest['database']['user_version']}  "
+                   f"{manifest['database']['size'] / 1024 / 1024:.1f} MB  {len(manifest['uploads'])} uploads")
+
+@app.cli.command('restore-backup')
+@click.argument('snapshot')
+@click.option('--backup-folder', 'source', default=None, help='Folder holding the snapshots (default: BACKUP_FOLDER, or instance/backups).')
+@click.option('--verify-only', is_flag=True, help='Check the snapshot against its manifest and stop.')
+@click.option('--skip-uploads', is_flag=True, help='Restore the database only.')
+@click.option('--yes', is_flag=True, help='Do not ask for confirmation.')
+def restore_backup_command(snapshot, source, verify_only, skip_uploads, yes):
+    """Verify a snapshot (a name from `flask backup --list`, a path, or "latest") and restore it."""
+    folder = backup_folder(source)
+    backups = list_backups(folder)
+    if snapshot == 'latest':
+        if not backups:
+            raise click.ClickException(f'No snapshots in {folder}')
+        path = backups[-1]
+    else:
+        path = snapshot if os.path.isdir(snapshot) else os.path.join(folder, snapshot)
+    problems = verify_backup(path)
+    for problem in problems:
+        click.echo(problem, err=True)
+    if problems:
+        raise click.ClickException(f'{path} failed verification; nothing was restored')
+    click.echo(f'{path} verified.')
+    if verify_only:
+        return
+    if not yes:
+        click.confirm(f"Replace {app.config['DATABASE']}{'' if skip_uploads else ' and uploads'} with this snapshot?", abort=True)
+    restored = restore_backup(path, uploads=not skip_uploads)
+    click.echo('Restored the database' + ('.' if skip_uploads else f' and {restored} upload file(s).'))
+
+@app.cli.command('process-uploads')
+@click.option('--force', is_flag=True, help='Reprocess images that already have derivatives.')
+def process_uploads_command(force):
+    """Backfill resized, metadata-free derivatives for existing uploads."""
+    conn = get_db_connection()
+    processed = saved = 0
+    for folder, table, column in UPLOAD_REFERENCES:
+        filenames = [row[0] for row in conn.execute(f'SELECT DISTINCT {column} FROM {table} WHERE {column} IS NOT NULL')]
+        for filename in filenames:
+            # Uploads get their media row before they are processed; variants
+            # are only recorded once they have been.
+            if not force and conn.execute('SELECT 1 FROM media WHERE folder = ? AND filename = ? AND variants IS NOT NULL',
+                                          (folder, filename)).fetchone():
+                continue
+            path = upload_path(folder, filename)
+            if not os.path.exists(path):
+                path = staged_upload_path(folder, filename)
+            if not os.path.exists(path):
+                click.echo(f'missing  {upload_path(folder, filename)}', err=True)
+                continue
+            before = os.path.getsize(path)
+            info = process_image(conn, folder, filename)
+            if info is None:
+                continue
+            if folder == 'events':
+                conn.execute('UPDATE event_images SET width = ?, height = ?, bytes = ? WHERE filename = ?',
+                             (info['width'], info['height'], info['bytes'], info['filename']))
+            conn.commit()
+            processed += 1
+            saved += before - info['bytes']
+            click.echo(f'{before:>10,d} -> {info["bytes"]:>10,d}  {path}')
+    if processed:
+        bump_content_generation()
+    click.echo(f'Processed {processed} image(s), {saved / 1024 / 1024:.1f} MB smaller.')
+
+# Single-row tables and bookkeeping tables are cheaper to scan than to index.
+QUERY_PLAN_SCAN_ALLOWED = {'hero_section', 'about_section', 'footer_section', 'schema_version', 'stats'}
+
+@app.cli.command('check-query-plans')
+def check_query_plans_command():
+    """Fail if any GET route runs a query that scans a table or sorts in a temp B-tree.
+
+    Every GET route is requested as a logged-in admin against a throwaway copy of
+    the database, each SELECT it issues is captured, and its EXPLAIN QUERY PLAN is
+    inspected.
+    """
+    tmpdir = tempfile.mkdtemp(prefix='ahss-plans-')
+    original_config = {key: app.config[key] for key in ('DATABASE', 'CONTENT_GENERATION_FILE', 'JOB_WORKERS')}
+    try:
+        source = sqlite3.connect(original_config['DATABASE'])
+        copy = sqlite3.connect(os.path.join(tmpdir, 'site.db'))
+        source.backup(copy)
+        source.close()
+        run_migrations(copy)
+        copy.close()
+        app.config['DATABASE'] = os.path.join(tmpdir, 'site.db')
+        app.config['CONTENT_GENERATION_FILE'] = os.path.join(tmpdir, 'site.db.generation')
+        # Requests would otherwise start job workers that run queued jobs
+        # against the real upload and export folders.
+        app.config['JOB_WORKERS'] = 0
+
+        statements = []
+        client = app.test_client()
+        for rule in sorted(app.url_map.iter_rules(), key=lambda r: r.rule):
+            view = app.view_functions[rule.endpoint]
+            if 'GET' not in rule.methods or rule.endpoint in ('static', 'admin_logout'):
+                continue
+            # GET-only routes that change public content also delete uploads.
+            if 'POST' not in rule.methods and getattr(view, 'invalidates_content', False):
+                continue
+            with client.session_transaction() as sess:
+                sess['admin_logged_in'] = True
+                sess['admin_id'] = 1
+            with app.app_context():
+                get_db_connection().set_trace_callback(statements.append)
+                client.get(re.sub(r'<[^>]+>', '1', rule.rule))
+                get_db_connection().set_trace_callback(None)
+
+        conn = sqlite3.connect(app.config['DATABASE'])
+        failures = []
+        for statement in dict.fromkeys(statements):
+            if not statement.lstrip().upper().startswith('SELECT'):
+                continue
+            for row in conn.execute('EXPLAIN QUERY PLAN ' + statement):
+                detail = row[3]
+                table_scan = re.match(r'SCAN (\w+)$', detail)
+                if (table_scan and table_scan.group(1) not in QUERY_PLAN_SCAN_ALLOWED) or 'TEMP B-TREE' in detail:
+                    failures.append((statement, detail))
+        conn.close()
+    finally:
+        app.config.update(original_config)
+        _page_cache.clear()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    for statement, detail in failures:
+        click.echo(f'{detail}\n    {statement}', err=True)
+    if failures:
+        raise click.ClickException(f'{len(failures)} query plan(s) fall back to a full scan or temp sort')
+    click.echo(f'Checked {len(set(statements))} statements: all use indexes.')
+
 if __name__ == '__main__':
-    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-    os.makedirs(app.config['UPLOAD_FOLDER_EVENTS'], exist_ok=True)
-    os.makedirs('static/uploads/team', exist_ok=True)
-    os.makedirs('static/uploads/hero', exist_ok=True)
-    os.makedirs('static/uploads/about', exist_ok=True)
+    for directory in app.config['UPLOAD_FOLDERS'].values():
+        os.makedirs(directory, exist_ok=True)
     
     if os.environ.get('SECRET_KEY'):
         app.secret_key = os.environ.get('SECRET_KEY')
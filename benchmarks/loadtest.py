@@ -0,0 +1,234 @@
+"""Run scripted load-test scenarios against gunicorn and record latency percentiles.
+
+Usage: python benchmarks/loadtest.py [--database seeded.db] [--scenarios home,contact,admin,upload]
+       python benchmarks/loadtest.py --compare old.json new.json
+
+Without --database a dataset is generated with seed.py first (see --events,
+--messages and --schools). Either way the server runs against a scratch copy.
+Each scenario reports p50/p95/p99 latency, requests per second, errors and
+the RSS of every gunicorn worker. Results are written as JSON tagged with the
+git commit so runs can be compared between commits.
+"""
+import argparse
+import http.client
+import io
+import json
+import math
+import os
+import platform
+import shutil
+import signal
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from datetime import datetime
+from urllib.parse import urlencode
+
+from seed import seed
+from throughput import ROOT, start_server
+
+ADMIN_PAGES = ('/admin/dashboard', '/admin/messages', '/admin/messages?status=unread', '/admin/events',
+               '/admin/schools', '/admin/team')
+FORM_HEADERS = {'Content-Type': 'application/x-www-form-urlencoded'}
+
+
+def login(port, username, password):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    conn.request('POST', '/admin/login', urlencode({'username': username, 'password': password}), FORM_HEADERS)
+    response = conn.getresponse()
+    response.read()
+    conn.close()
+    cookie = response.getheader('Set-Cookie', '').split(';')[0]
+    if response.status != 302 or not cookie:
+        raise RuntimeError('admin login failed')
+    return cookie
+
+
+def upload_body(files):
+    from PIL import Image
+
+    boundary = 'ahss-loadtest-boundary'
+    parts = []
+    fields = {'title': 'Load test', 'description': 'Uploaded by loadtest.py', 'event_date': '2030-01-01',
+              'event_type': 'upcoming', 'registration_link': ''}
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for i in range(files):
+        buffer = io.BytesIO()
+        Image.effect_noise((2400, 1600), 64 + i).convert('RGB').save(buffer, 'JPEG', quality=90)
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="event_images"; filename="photo{i}.jpg"\r\n'
+                     f'Content-Type: image/jpeg\r\n\r\n'.encode() + buffer.getvalue() + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def build_scenarios(cookie, upload_files):
+    admin = {'Cookie': cookie}
+    body, headers = upload_body(upload_files)
+    contact = urlencode({'name': 'Bench', 'email': 'bench@example.com', 'message': 'x' * 200})
+    return {
+        'home': [('GET', '/', None, {})],
+        'contact': [('POST', '/contact', contact, FORM_HEADERS)],
+        'admin': [('GET', path, None, admin) for path in ADMIN_PAGES],
+        'upload': [('POST', '/admin/events/new', body, dict(headers, **admin))],
+    }
+
+
+def run_client(port, requests, stop_at, latencies, errors):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    i = 0
+    while time.time() < stop_at:
+        method, path, body, headers = requests[i % len(requests)]
+        i += 1
+        start = time.perf_counter()
+        try:
+            conn.request(method, path, body, headers)
+            response = conn.getresponse()
+            response.read()
+            latencies.append(time.perf_counter() - start)
+            if response.status >= 400:
+                errors.append(response.status)
+        except (OSError, http.client.HTTPException) as e:
+            errors.append(type(e).__name__)
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=30)
+    conn.close()
+
+
+def drive(port, requests, clients, seconds):
+    latencies, errors = [], []
+    stop_at = time.time() + seconds
+    threads = [threading.Thread(target=run_client, args=(port, requests, stop_at, latencies, errors)) for _ in range(clients)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, errors
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def worker_rss(master_pid):
+    """Return {pid: RSS in MB} for the gunicorn workers forked from master_pid (Linux only)."""
+    rss = {}
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/status') as f:
+                status = dict(line.split(':', 1) for line in f if ':' in line)
+        except OSError:
+            continue
+        if int(status.get('PPid', '0').strip()) == master_pid and 'VmRSS' in status:
+            rss[int(entry)] = round(int(status['VmRSS'].split()[0]) / 1024, 1)
+    return rss
+
+
+def git_revision():
+    def git(*args):
+        return subprocess.run(['git', *args], cwd=ROOT, capture_output=True, text=True).stdout.strip()
+    return {'commit': git('rev-parse', 'HEAD'), 'subject': git('log', '-1', '--format=%s'),
+            'dirty': bool(git('status', '--porcelain', '--untracked-files=no'))}
+
+
+def dataset_counts(database):
+    conn = sqlite3.connect(database)
+    counts = {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+              for table in ('events', 'event_images', 'contact_messages', 'schools', 'team_members')}
+    conn.close()
+    return counts
+
+
+def compare(old_path, new_path):
+    with open(old_path) as f:
+        old = json.load(f)
+    with open(new_path) as f:
+        new = json.load(f)
+    print(f"old {old['git']['commit'][:10]}  {old['git']['subject']}")
+    print(f"new {new['git']['commit'][:10]}  {new['git']['subject']}")
+    for name, result in new['scenarios'].items():
+        before = old['scenarios'].get(name)
+        if not before:
+            continue
+        for key in ('rps', 'p50_ms', 'p95_ms', 'p99_ms'):
+            if before[key] and result[key]:
+                change = (result[key] - before[key]) / before[key] * 100
+                print(f'{name:8s} {key:7s} {before[key]:9.1f} -> {result[key]:9.1f}  ({change:+.1f}%)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--database', help='seeded database to copy; generated with seed.py when omitted')
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--schools', type=int, default=500)
+    parser.add_argument('--scenarios', default='home,contact,admin,upload')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument('--upload-files', type=int, default=3, help='images per upload request')
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<commit>-<time>.json)')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), help='print the difference between two result files')
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    tmpdir = tempfile.mkdtemp(prefix='ahss-loadtest-')
+    database = os.path.join(tmpdir, 'site.db')
+    if args.database:
+        shutil.copy(args.database, database)
+    else:
+        print(f'Seeding {args.events} events, {args.messages} messages, {args.schools} schools...')
+        seed(database, args.events, args.messages, args.schools)
+    results = {'git': git_revision(), 'started_at': datetime.now().isoformat(timespec='seconds'),
+               'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version,
+               'settings': {key: getattr(args, key) for key in ('workers', 'threads', 'clients', 'seconds', 'upload_files')},
+               'dataset': dataset_counts(database), 'scenarios': {}}
+
+    proc = start_server(args.port, args.workers, args.threads, database, cwd=tmpdir)
+    try:
+        scenarios = build_scenarios(login(args.port, args.username, args.password), args.upload_files)
+        for name in args.scenarios.split(','):
+            requests = scenarios[name]
+            drive(args.port, requests, args.clients, args.warmup)
+            latencies, errors = drive(args.port, requests, args.clients, args.seconds)
+            latencies.sort()
+            result = {
+                'requests': len(latencies),
+                'errors': len(errors),
+                'rps': round(len(latencies) / args.seconds, 1),
+                'p50_ms': percentile(latencies, 50) and round(percentile(latencies, 50) * 1000, 2),
+                'p95_ms': percentile(latencies, 95) and round(percentile(latencies, 95) * 1000, 2),
+                'p99_ms': percentile(latencies, 99) and round(percentile(latencies, 99) * 1000, 2),
+                'worker_rss_mb': worker_rss(proc.pid),
+            }
+            results['scenarios'][name] = result
+            print(f"{name:8s} {result['rps']:8.1f} req/s  p50 {result['p50_ms']} ms  p95 {result['p95_ms']} ms  "
+                  f"p99 {result['p99_ms']} ms  errors {result['errors']}  rss {sorted(result['worker_rss_mb'].values())} MB")
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    output = args.output or os.path.join(ROOT, 'benchmarks', 'results',
+                                         f"{results['git']['commit'][:10]}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f'Results written to {output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Fill a fresh database with synthetic content for load testing.
+
+Usage: python benchmarks/seed.py OUTPUT.db [--events 10000] [--messages 1000000] [--schools 500]
+
+The schema comes from the app's own migrations, so the seeded file matches
+whatever commit is checked out. Image rows reference a small pool of
+content-hashed filenames with media metadata; no image files are written,
+since the benchmarks only measure the HTML responses.
+"""
+import argparse
+import hashlib
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORDS = ('science', 'olympiad', 'robotics', 'chemistry', 'physics', 'biology', 'mathematics', 'students', 'workshop',
+         'camp', 'research', 'laboratory', 'mentor', 'competition', 'project', 'innovation', 'community', 'school')
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize() + '.'
+
+
+def image_pool(folder, count):
+    pool = []
+    for i in range(count):
+        stem = hashlib.sha256(f'seed-{folder}-{i}'.encode()).hexdigest()
+        variants = [{'width': w, 'filename': f'derived/{stem}-{w}.webp', 'bytes': w * 40} for w in (320, 768, 1200)]
+        pool.append((folder, f'{stem}.jpg', 1200, 800, 180000, json.dumps(variants), stem))
+    return pool
+
+
+def create_schema(database):
+    # Importing the app runs init_db(), which applies every migration to DATABASE.
+    subprocess.run([sys.executable, '-c', 'import app'], cwd=ROOT, env=dict(os.environ, DATABASE=database), check=True)
+
+
+def seed(database, events=10000, messages=1000000, schools=500, team=24, images_per_event=4, random_seed=0):
+    rng = random.Random(random_seed)
+    if os.path.exists(database):
+        raise FileExistsError(database)
+    create_schema(database)
+    conn = sqlite3.connect(database)
+    conn.execute('PRAGMA synchronous = OFF')
+    started = time.time()
+    today = date.today()
+    pools = {folder: image_pool(folder, 40) for folder in ('events', 'schools', 'team', 'hero', 'about')}
+    ref_counts = {}
+
+    def pick(folder):
+        filename = rng.choice(pools[folder])[1]
+        ref_counts[(folder, filename)] = ref_counts.get((folder, filename), 0) + 1
+        return filename
+
+    with conn:
+        conn.execute('INSERT INTO hero_section (agency_name, main_title, description, button_text, image_filename) VALUES (?, ?, ?, ?, ?)',
+                     ('AHSS', sentence(rng, 5), sentence(rng, 30), 'Learn more', pick('hero')))
+        conn.execute('''INSERT INTO about_section (main_title, lead_text, description, image_filename, feature1_title,
+                        feature1_description, feature2_title, feature2_description) VALUES (?, ?, ?, ?, ?, ?, ?, ?)''',
+                     (sentence(rng, 4), sentence(rng, 15), sentence(rng, 60), pick('about'), sentence(rng, 2),
+                      sentence(rng, 12), sentence(rng, 2), sentence(rng, 12)))
+        conn.execute('INSERT INTO footer_section (description, contact_email) VALUES (?, ?)',
+                     (sentence(rng, 20), 'info@example.com'))
+        conn.executemany('INSERT INTO schools (name, description, logo_filename, website_link, is_active) VALUES (?, ?, ?, ?, ?)',
+                         ((f'School {i}', sentence(rng, 25), pick('schools'), f'https://school{i}.example.com', rng.random() < 0.9)
+                          for i in range(schools)))
+        conn.executemany('''INSERT INTO team_members (name, position, description, image_filename, social_links, display_order)
+                            VALUES (?, ?, ?, ?, ?, ?)''',
+                         ((f'Member {i}', sentence(rng, 2), sentence(rng, 20), pick('team'), '{}', i) for i in range(team)))
+        for i in range(events):
+            event_date = today + timedelta(days=rng.randint(-3 * 365, 180))
+            cursor = conn.execute('''INSERT INTO events (title, description, event_date, event_type, registration_link, is_active)
+                                     VALUES (?, ?, ?, ?, ?, ?)''',
+                                  (sentence(rng, 4), sentence(rng, 40), event_date.isoformat(),
+                                   'upcoming' if event_date >= today else 'past', 'https://example.com/register',
+                                   rng.random() < 0.95))
+            conn.executemany('INSERT INTO event_images (event_id, filename, position, width, height, bytes) VALUES (?, ?, ?, ?, ?, ?)',
+                             ((cursor.lastrowid, pick('events'), position, 1200, 800, 180000)
+                              for position in range(rng.randint(0, images_per_event))))
+        conn.executemany('INSERT INTO media (folder, filename, width, height, bytes, variants, sha256, ref_count) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                         (row + (ref_counts[row[:2]],) for pool in pools.values() for row in pool if row[:2] in ref_counts))
+
+        start = datetime.now() - timedelta(days=730)
+        span = 730 * 24 * 3600
+        batch = 50000
+        for offset in range(0, messages, batch):
+            conn.executemany('INSERT INTO contact_messages (name, email, message, is_read, created_at) VALUES (?, ?, ?, ?, ?)',
+                             ((f'Visitor {i}', f'visitor{i}@example.com', sentence(rng, rng.randint(10, 80)), rng.random() < 0.8,
+                               (start + timedelta(seconds=rng.randrange(span))).strftime('%Y-%m-%d %H:%M:%S'))
+                              for i in range(offset, min(offset + batch, messages))))
+    conn.execute('PRAGMA optimize')
+    conn.close()
+    return time.time() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('output')
+    parser.add_argument('--events', type=int, default=10000)
+    parser.add_argument('--messages', type=int, default=1000000)
+    parser.add_argument('--schools', type=int, default=500)
+    parser.add_argument('--team', type=int, default=24)
+    parser.add_argument('--images-per-event', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0, help='random seed; the same seed gives the same rows')
+    args = parser.parse_args()
+    elapsed = seed(args.output, args.events, args.messages, args.schools, args.team, args.images_per_event, args.seed)
+    print(f'Seeded {args.output} in {elapsed:.1f}s ({os.path.getsize(args.output) / 1e6:.0f} MB)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""Measure / and /contact throughput against a local gunicorn instance.
+
+Usage: python benchmarks/throughput.py [--threads 8] [--clients 16] [--seconds 10]
+
+The app is started from a scratch copy of site.db so the benchmark never
+touches the real database.
+"""
+import argparse
+import http.client
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from urllib.parse import urlencode
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def start_server(port, workers, threads, database, cwd=ROOT):
+    # Uploads are written under UPLOAD_ROOT, so pointing it at the scratch cwd
+    # keeps benchmark uploads out of static/uploads.
+    # Every benchmark client shares one address, so the per-client limits would
+    # turn the contact scenario into a 429 benchmark.
+    env = dict(os.environ, DATABASE=database, RATE_LIMIT_ENABLED='false', UPLOAD_ROOT=cwd)
+    proc = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', 'app:app', '-c', os.path.join(ROOT, 'gunicorn.conf.py'),
+         '-b', f'127.0.0.1:{port}', '--pythonpath', ROOT,
+         '-w', str(workers), '-k', 'gthread', '--threads', str(threads), '--log-level', 'warning'],
+        cwd=cwd, env=env)
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=1)
+            conn.request('GET', '/')
+            conn.getresponse().read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError('gunicorn did not start')
+
+
+def run_client(port, scenario, stop_at, results):
+    conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    body = urlencode({'name': 'Bench', 'email': 'bench@example.com', 'message': 'x' * 200})
+    headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+    count = 0
+    errors = 0
+    while time.time() < stop_at:
+        try:
+            if scenario == 'contact':
+                conn.request('POST', '/contact', body, headers)
+            else:
+                conn.request('GET', '/')
+            response = conn.getresponse()
+            response.read()
+            if response.status >= 500:
+                errors += 1
+            count += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+    results.append((scenario, count, errors))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--contact-share', type=float, default=0.25,
+                        help='fraction of clients posting to /contact')
+    parser.add_argument('--seconds', type=float, default=10)
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix='ahss-bench-')
+    database = os.path.join(tmpdir, 'site.db')
+    shutil.copy(os.path.join(ROOT, 'site.db'), database)
+    proc = start_server(args.port, args.workers, args.threads, database)
+    try:
+        contact_clients = int(round(args.clients * args.contact_share))
+        results = []
+        stop_at = time.time() + args.seconds
+        clients = [threading.Thread(target=run_client,
+                                    args=(args.port, 'contact' if i < contact_clients else 'index', stop_at, results))
+                   for i in range(args.clients)]
+        for client in clients:
+            client.start()
+        for client in clients:
+            client.join()
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait()
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+    for scenario in ('index', 'contact'):
+        count = sum(r[1] for r in results if r[0] == scenario)
+        errors = sum(r[2] for r in results if r[0] == scenario)
+        print(f'{scenario:8s} {count / args.seconds:9.1f} req/s  ({count} requests, {errors} errors)')
+
+
+if __name__ == '__main__':
+    main()
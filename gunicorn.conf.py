@@ -0,0 +1,20 @@
+"""Gunicorn settings, read automatically by `gunicorn app:app` from the project root.
+
+The app is imported once in the master (preload_app), which bootstraps the
+schema if needed, and warm_up() compiles the templates and renders the home
+page before any worker is forked. Workers inherit all of it copy-on-write and
+serve fast from their first request.
+"""
+import os
+
+preload_app = True
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+
+
+def when_ready(server):
+    from app import warm_up
+
+    warm_up()
+    server.log.info('Templates compiled and home page cached before forking workers')